@@ -10,18 +10,27 @@ import sys
 import logging
 import sqlite3
 import json
+import array
+import heapq
+import queue
 import random
+import time as _time
 from datetime import datetime, timedelta, time
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator, Final
 from collections import Counter, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageDraw, ImageFont
 from tupian import ResultImageGenerator
 from xuanji_scraper import XuanjiImageScraper
 import asyncio
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden, RetryAfter
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -35,6 +44,7 @@ from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 import pytz
 from prediction_engine_ultimate import PredictionEngineUltimate, TRADITIONAL_TO_SIMPLIFIED
+import predictor_kernels
 
 # Load environment variables
 load_dotenv()
@@ -46,9 +56,25 @@ CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "5"))
 DATABASE_PATH = os.getenv("DATABASE_PATH", "lottery.db")
 TIMEZONE = os.getenv("TIMEZONE", "Asia/Shanghai")
 LOTTERY_TIME = os.getenv("LOTTERY_TIME", "21:32:32")
+HISTORY_SYNC_BATCH_SIZE = 500
 # 管理员白名单
 ADMIN_USER_IDS = os.getenv('ADMIN_USER_IDS', '').split(',')
 ADMIN_USER_IDS = [int(uid.strip()) for uid in ADMIN_USER_IDS if uid.strip().isdigit()]
+
+# Shared keep-alive HTTP session for all outbound requests
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=(502, 503, 504))
+)
+SESSION = requests.Session()
+SESSION.mount('https://', _ADAPTER)
+SESSION.mount('http://', _ADAPTER)
+SESSION.headers.update({
+    'Connection': 'keep-alive',
+    'Accept-Encoding': 'gzip, deflate'
+})
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -61,19 +87,20 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Zodiac mapping (correct mapping verified with real API data)
-ZODIAC_NUMBERS = {
-    '鼠': [6, 18, 30, 42],
-    '牛': [5, 17, 29, 41],
-    '虎': [4, 16, 28, 40],
-    '兔': [3, 15, 27, 39],
-    '龙': [2, 14, 26, 38],
-    '蛇': [1, 13, 25, 37, 49],
-    '马': [12, 24, 36, 48],
-    '羊': [11, 23, 35, 47],
-    '猴': [10, 22, 34, 46],
-    '鸡': [9, 21, 33, 45],
-    '狗': [8, 20, 32, 44],
-    '猪': [7, 19, 31, 43]
+# 常量表，使用不可变 tuple
+ZODIAC_NUMBERS: Final = {
+    '鼠': (6, 18, 30, 42),
+    '牛': (5, 17, 29, 41),
+    '虎': (4, 16, 28, 40),
+    '兔': (3, 15, 27, 39),
+    '龙': (2, 14, 26, 38),
+    '蛇': (1, 13, 25, 37, 49),
+    '马': (12, 24, 36, 48),
+    '羊': (11, 23, 35, 47),
+    '猴': (10, 22, 34, 46),
+    '鸡': (9, 21, 33, 45),
+    '狗': (8, 20, 32, 44),
+    '猪': (7, 19, 31, 43)
 }
 
 # Zodiac emoji mapping
@@ -89,12 +116,350 @@ ZODIAC_EMOJI = {
     '猴': '🐵', '雞': '🐔', '狗': '🐶', '豬': '🐖'
 }
 
+# Canonical (interned) zodiac strings, so parsed/loaded zodiacs share one object per name
+_ZODIAC_INTERN: Final = {zodiac: sys.intern(zodiac) for zodiac in ZODIAC_EMOJI}
+
+# Pre-rendered "emoji + zodiac" labels
+ZODIAC_LABEL = {zodiac: f"{emoji}{zodiac}" for zodiac, emoji in ZODIAC_EMOJI.items()}
+
 # Reverse mapping: number to zodiac
 NUMBER_TO_ZODIAC = {}
 for zodiac, numbers in ZODIAC_NUMBERS.items():
     for num in numbers:
         NUMBER_TO_ZODIAC[num] = zodiac
 
+# Pre-rendered "emoji + zodiac" label per number
+NUMBER_TO_LABEL = {num: ZODIAC_LABEL.get(zodiac, zodiac) for num, zodiac in NUMBER_TO_ZODIAC.items()}
+
+# Bar-graph strings by length (percentages * 2 top out at 200)
+BARS = tuple("█" * i for i in range(201))
+
+# Zero-padded two-digit number strings, index = number
+TWO_DIGIT: Final = tuple(f"{i:02d}" for i in range(100))
+
+# Row separator of the history list
+HISTORY_SEP = "─" * 30 + "\n"
+
+# Array form of NUMBER_TO_ZODIAC (index = number) for hash-free lookups
+_NUM2ZOD: Final = tuple(NUMBER_TO_ZODIAC.get(num) for num in range(51))
+
+# Zodiac id (ZODIAC_NUMBERS order) used by the numeric kernels
+ZODIAC_LIST: Final = tuple(ZODIAC_NUMBERS)
+ZODIAC_INDEX: Final = {zodiac: i for i, zodiac in enumerate(ZODIAC_LIST)}
+
+# Number -> zodiac id (-1 for numbers without a zodiac), index = number
+NUMBER_TO_ZIDX: Final = tuple(ZODIAC_INDEX.get(_NUM2ZOD[num], -1) for num in range(50))
+
+# Padded zodiac id -> numbers matrix and row lengths for vectorized picks
+if predictor_kernels.NUMPY_AVAILABLE:
+    ZODIAC_NUMS_ARR, ZODIAC_NUM_LEN = predictor_kernels.make_zodiac_tables(ZODIAC_NUMBERS)
+else:
+    ZODIAC_NUMS_ARR, ZODIAC_NUM_LEN = None, None
+
+
+def parse_open_code(open_code: str) -> List[int]:
+    """Parse comma-separated open code ("01,02,...") into ints"""
+    # int() ignores surrounding whitespace, so no per-item strip() needed
+    return list(map(int, open_code.split(',')))
+
+
+def parse_zodiacs(zodiac_str: str) -> List[str]:
+    """Parse comma-separated zodiacs ("鼠, 牛,...") into canonical zodiac strings"""
+    return [_ZODIAC_INTERN.get(z, z) for z in map(str.strip, zodiac_str.split(','))]
+
+
+# Message templates: static text is built once, only the fields are filled per call
+PREDICT_MENU_TEMPLATE = """
+🎯 <b>智能预测菜单</b>
+
+➖➖➖➖➖➖➖
+📅 下期期号：{next_expect}
+⏰ 开奖倒计时：{countdown}
+➖➖➖➖➖➖➖
+🔮 <b>AI 生肖预测（TOP 2）</b> ⭐ 推荐
+
+基于多维度分析预测最可能的2个生肖
+• 频率分析 (30%)
+• 遗漏分析 (30%)
+• 周期分析 (20%)
+• 趋势分析 (20%)
+
+📊 预测状态：{prediction_status}
+➖➖➖➖➖➖➖
+⚠️ 免责声明
+本机器人仅供娱乐和学习参考，预测结果不构成任何投资建议。请理性娱乐，谨慎决策。
+
+⚠️ 预测仅供参考，不保证准确性
+"""
+
+ZODIAC_PREDICTION_TEMPLATE = """
+🎯 <b>AI 生肖预测（TOP 2）</b>
+
+📊 <b>18维度综合分析</b>
+""" + '═' * 27 + """
+🥇 第一预测：{emoji1} {zodiac1} (置信度: {confidence1:.1f}%)
+🥈 第二预测：{emoji2} {zodiac2} (置信度: {confidence2:.1f}%)
+
+📈 <b>分析维度：</b>
+✅ 马尔可夫链 | ✅ 傅里叶周期
+✅ 贝叶斯概率 | ✅ 蒙特卡洛验证
+✅ 五行分析   | ✅ 波色分析
+✅ 生肖关系   | ✅ 大小单双
+✅ 遗漏分析   | ✅ 热度分析
+✅ 周期规律   | ✅ 连开惩罚
+✅ 号码冷热   | ✅ 尾数走势
+✅ 质合分析   | ✅ 重复惩罚
+
+🔢 <b>对应号码：</b>
+{zodiac1}：{numbers1}
+{zodiac2}：{numbers2}
+
+➖➖➖➖➖➖➖
+"""
+
+ZODIAC_PREDICTION_LOCKED_FOOTER = """
+➖➖➖➖➖➖➖
+⚠️ <b>重要提示</b>
+
+✅ 本期预测已锁定，无法修改
+✅ 开奖后将自动对比结果
+✅ 结果将记录到预测历史
+
+💡 <i>预测仅供参考，请理性对待</i>
+"""
+
+# 开奖通知
+NOTIFY_RESULT_TEMPLATE = """
+🎰 <b>【新开奖结果】</b>
+
+➖➖➖➖➖➖➖
+📅 期号：{expect}
+⏰ 时间：{open_time}
+
+🎲 正码：<code>{codes}</code>
+
+➖➖➖➖➖➖➖
+🌟 <b>特码：{tema:02d}</b>  {tema_label}
+➖➖➖➖➖➖➖
+"""
+
+NOTIFY_PREDICTION_TEMPLATE = """
+
+🔮 <b>AI 预测对比</b>
+
+预测：{label1} + {label2}
+结果：{tema_label}
+
+"""
+
+NOTIFY_HIT_TOP1 = "🎉 <b>预测命中！TOP1 生肖正确！</b>\n"
+NOTIFY_HIT_TOP2 = "🎊 <b>预测命中！TOP2 生肖正确！</b>\n"
+NOTIFY_MISS = "💔 <b>很遗憾，本期预测未中</b>\n"
+
+NOTIFY_STATS_TEMPLATE = """
+
+➖➖➖➖➖➖➖
+📊 <b>命中率统计</b>
+
+总命中率：{hit_rate:.1f}%
+"""
+
+NOTIFY_RECENT10_TEMPLATE = "近10期：{recent_10_hits}/{recent_10_total} = {recent_10_rate:.1f}%\n"
+
+MAIN_MENU_TEMPLATE = """
+🎰 <b>预测机器人</b> 🎰
+
+👋 欢迎，{first_name}！
+
+📅 今日开奖倒计时：<code>{countdown}</code>
+⏰ 开奖时间：每晚 """ + LOTTERY_TIME + """
+
+⚠️ <b>免责声明</b>
+本机器人仅供娱乐和学习参考，预测结果不构成任何投资建议。请理性娱乐，谨慎决策。
+
+请选择功能：
+"""
+
+SETTINGS_MENU_TEMPLATE = """
+⚙️ <b>个人设置</b>
+
+当前设置状态：
+
+🔔 <b>开奖通知：</b>{notify_status}
+⏰ <b>开奖提醒：</b>{reminder_status}
+🤖 <b>自动预测：</b>{auto_predict_status}
+
+点击下方按钮切换设置：
+"""
+
+HISTORY_MENU_TEXT = """
+📜 <b>历史记录菜单</b>
+
+查询历史开奖结果：
+
+选择查询范围：
+"""
+
+HELP_TEXT = """
+❓ <b>帮助信息</b>
+
+<b>📌 功能说明：</b>
+
+<b>🎯 智能预测</b>
+• AI综合预测：多因素分析
+• 生肖预测：基于生肖周期
+• 冷热号预测：统计分析
+
+<b>📊 最新开奖</b>
+• 查看最新期开奖结果
+• 显示特码和生肖
+
+<b>📈 数据分析</b>
+• 频率分析：号码出现统计
+• 生肖分布：生肖比例分析
+• 遗漏分析：未出号码追踪
+• 冷热分析：冷热号对比
+
+<b>📜 历史记录</b>
+• 查询历史开奖数据
+• 支持多种查询范围
+
+<b>⚙️ 个人设置</b>
+• 开奖通知：自动推送结果
+• 开奖提醒：21:00提醒
+• 自动预测：开奖后自动预测
+
+<b>⏰ 开奖时间：</b>
+每晚 21:32:32 (北京时间)
+
+<b>⚠️ 注意事项：</b>
+• 预测仅供参考
+• 请理性对待
+• 谨慎决策
+
+如有问题，请联系管理员。
+"""
+
+# 静态菜单键盘，模块加载时构建一次
+MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🎯 智能预测", callback_data="menu_predict"),
+        InlineKeyboardButton("📊 最新开奖", callback_data="latest_result"),
+    ],
+    [
+        InlineKeyboardButton("📈 数据分析", callback_data="menu_analysis"),
+        InlineKeyboardButton("📜 历史记录", callback_data="menu_history"),
+    ],
+    [
+        InlineKeyboardButton("🔮 玄机预测图", callback_data="xuanji_menu"),
+    ],
+    [
+        InlineKeyboardButton("⚙️ 个人设置", callback_data="menu_settings"),
+        InlineKeyboardButton("❓ 帮助", callback_data="help"),
+    ],
+])
+
+PREDICT_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔮 AI 生肖预测（TOP 2）⭐", callback_data="ai_zodiac_predict")],
+    [InlineKeyboardButton("🎲 三中三预测", callback_data="predict_3in3")],
+    [
+        InlineKeyboardButton("🤖 综合预测", callback_data="predict_comprehensive"),
+        InlineKeyboardButton("🐲 生肖预测", callback_data="predict_zodiac"),
+    ],
+    [
+        InlineKeyboardButton("🔥 热号预测", callback_data="predict_hot"),
+        InlineKeyboardButton("❄️ 冷号预测", callback_data="predict_cold"),
+    ],
+    [InlineKeyboardButton("📊 预测历史", callback_data="prediction_history")],
+    [InlineKeyboardButton("🔙 返主菜单", callback_data="back_to_main")],
+])
+
+ANALYSIS_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📊 频率分析", callback_data="analysis_frequency"),
+        InlineKeyboardButton("🐲 生肖分布", callback_data="analysis_zodiac"),
+    ],
+    [
+        InlineKeyboardButton("⏱ 遗漏分析", callback_data="analysis_missing"),
+        InlineKeyboardButton("🌡 冷热分析", callback_data="analysis_hotcold"),
+    ],
+    [
+        InlineKeyboardButton("📈 走势分析", callback_data="analysis_trends"),
+        InlineKeyboardButton("📋 综合报告", callback_data="analysis_comprehensive"),
+    ],
+    [InlineKeyboardButton("🔙 返回主菜单", callback_data="back_to_main")],
+])
+
+HISTORY_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("最近10期", callback_data="history_10"),
+        InlineKeyboardButton("最近20期", callback_data="history_20"),
+    ],
+    [
+        InlineKeyboardButton("最近30期", callback_data="history_30"),
+        InlineKeyboardButton("最近50期", callback_data="history_50"),
+    ],
+    [InlineKeyboardButton("🔙 返回主菜单", callback_data="back_to_main")],
+])
+
+BACK_TO_MAIN_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 返回主菜单", callback_data="back_to_main")]])
+BACK_TO_ANALYSIS_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 返回分析菜单", callback_data="menu_analysis")]])
+BACK_TO_HISTORY_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 返回历史菜单", callback_data="menu_history")]])
+
+PREDICT_METHOD_NAMES = {
+    'comprehensive': 'AI综合预测',
+    'zodiac': '生肖预测',
+    'hot': '热号预测',
+    'cold': '冷号预测',
+    'frequency': '频率预测'
+}
+
+
+def _predict_result_markup(method: str) -> InlineKeyboardMarkup:
+    """Keyboard under a prediction result: predict again / back to the predict menu"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔄 重新预测", callback_data=f"predict_{method}")],
+        [InlineKeyboardButton("🔙 返回预测菜单", callback_data="menu_predict")],
+    ])
+
+
+PREDICT_RESULT_MARKUPS = {method: _predict_result_markup(method) for method in PREDICT_METHOD_NAMES}
+
+
+def _build_settings_menu(notify: bool, reminder: bool, auto_predict: bool) -> Tuple[str, InlineKeyboardMarkup]:
+    """Render the settings menu text and keyboard for one combination of switches"""
+    notify_status = "✅ 已开启" if notify else "❌ 已关闭"
+    reminder_status = "✅ 已开启" if reminder else "❌ 已关闭"
+    auto_predict_status = "✅ 已开启" if auto_predict else "❌ 已关闭"
+    
+    message = SETTINGS_MENU_TEMPLATE.format(
+        notify_status=notify_status,
+        reminder_status=reminder_status,
+        auto_predict_status=auto_predict_status
+    )
+    markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"🔔 开奖通知 {notify_status}", callback_data="setting_notify")],
+        [InlineKeyboardButton(f"⏰ 开奖提醒 (21:00) {reminder_status}", callback_data="setting_reminder")],
+        [InlineKeyboardButton(f"🤖 自动预测 {auto_predict_status}", callback_data="setting_auto_predict")],
+        [InlineKeyboardButton("🔙 返回主菜单", callback_data="back_to_main")],
+    ])
+    return message, markup
+
+
+# 设置按钮回调 -> user_settings 列名
+SETTING_CALLBACKS = {
+    'setting_notify': 'notify_enabled',
+    'setting_reminder': 'reminder_enabled',
+    'setting_auto_predict': 'auto_predict',
+}
+
+# 设置菜单只有 8 种开关组合，全部预先渲染，键为 (通知, 提醒, 自动预测)
+SETTINGS_MENUS = {
+    (notify, reminder, auto_predict): _build_settings_menu(notify, reminder, auto_predict)
+    for notify in (False, True) for reminder in (False, True) for auto_predict in (False, True)
+}
+
+
 # 权限检查装饰器
 def admin_only(func):
     """装饰器：仅管理员可用"""
@@ -118,174 +483,354 @@ def admin_only(func):
     return wrapper
 
 
+# 常用 SQL 语句：模块级常量，同一文本在连接的语句缓存中始终命中
+_LOTTERY_COLUMNS = 'expect, open_code, tema, tema_zodiac, open_time'
+_SQL_SAVE_LOTTERY = f'INSERT OR REPLACE INTO lottery_history ({_LOTTERY_COLUMNS}) VALUES (?, ?, ?, ?, ?)'
+_SQL_LATEST = f'SELECT {_LOTTERY_COLUMNS} FROM lottery_history ORDER BY expect DESC LIMIT 1'
+_SQL_HISTORY = f'SELECT {_LOTTERY_COLUMNS} FROM lottery_history ORDER BY expect DESC LIMIT ?'
+_SQL_RESULT_BY_EXPECT = f'SELECT {_LOTTERY_COLUMNS} FROM lottery_history WHERE expect = ?'
+_SQL_RESULT_BY_SUFFIX = f'SELECT {_LOTTERY_COLUMNS} FROM lottery_history WHERE expect LIKE ? ORDER BY expect DESC LIMIT 1'
+_SQL_USER_SETTINGS = 'SELECT * FROM user_settings WHERE user_id = ?'
+_SQL_NOTIFY_USERS = 'SELECT user_id FROM user_settings WHERE notify_enabled = 1'
+_SQL_REMINDER_USERS = 'SELECT user_id FROM user_settings WHERE reminder_enabled = 1'
+# 开关类设置的切换语句，按列名预先生成（列名即白名单）
+_SQL_TOGGLE_SETTING = {
+    column: f'UPDATE user_settings SET {column} = CASE WHEN {column} THEN 0 ELSE 1 END, '
+            'updated_at = CURRENT_TIMESTAMP WHERE user_id = ? RETURNING *'
+    for column in ('notify_enabled', 'reminder_enabled', 'auto_predict')
+}
+_SQL_CAN_PREDICT = 'SELECT id FROM prediction_records WHERE expect = ?'
+_SQL_PREDICTION_RECORD = 'SELECT * FROM prediction_records WHERE expect = ?'
+
+
 class DatabaseHandler:
     """Handle all database operations"""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: int = 4):
         self.db_path = db_path
+        # 开奖数据写入后通知各缓存失效
+        self._invalidation_callbacks = []
+        # 历史查询缓存（按 limit），新开奖写入后清空；版本号防止并发读写回旧数据
+        self._history_cache: Dict[int, List[Dict]] = {}
+        self._history_arrays_cache: Dict[int, Tuple[array.array, array.array]] = {}
+        self._history_version = 0
+        # 最新一期缓存（None 表示未缓存），同样随历史版本失效
+        self._latest: Optional[Dict] = None
+        # 通知/提醒用户集合缓存（None 表示未加载），设置变更时增量维护
+        self._notify_users: Optional[set] = None
+        self._reminder_users: Optional[set] = None
+        # 命中率统计缓存，开奖结果回填预测记录时失效
+        self._hit_rate: Optional[Dict] = None
+        # 连接池：连接只打开一次，保留 SQLite 的页缓存
+        self._pool = queue.Queue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(self._open_connection())
         self.init_database()
     
-    def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
+    @property
+    def version(self) -> int:
+        """Lottery history version, bumped on every write"""
+        return self._history_version
+    
+    def add_invalidation_callback(self, callback):
+        """Register a callable run whenever lottery history changes"""
+        self._invalidation_callbacks.append(callback)
+    
+    def _notify_history_changed(self):
+        """Run registered history invalidation callbacks"""
+        self._history_version += 1
+        self._history_cache.clear()
+        self._history_arrays_cache.clear()
+        self._latest = None
+        for callback in self._invalidation_callbacks:
+            callback()
+    
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a pooled database connection"""
+        # isolation_level=None: autocommit，多语句写入由 _transaction 显式控制
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                               cached_statements=256)
         conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=-40000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        # 读路径走内存映射，池内连接共享同一份 OS 页缓存
+        conn.execute('PRAGMA mmap_size=268435456')
         return conn
     
+    @contextmanager
+    def _acquire(self):
+        """Borrow a connection from the pool"""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+    
+    def optimize(self):
+        """Refresh planner statistics (after bulk loads and on shutdown)"""
+        with self._acquire() as conn:
+            conn.execute('PRAGMA optimize')
+    
+    def close(self):
+        """Close every pooled connection (call once on shutdown)"""
+        self.optimize()
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+    
+    @contextmanager
+    def _transaction(self):
+        """Borrow a connection and run the block in one write transaction"""
+        with self._acquire() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+    
     def init_database(self):
         """Initialize database tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Lottery history table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS lottery_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                expect TEXT UNIQUE NOT NULL,
-                open_code TEXT NOT NULL,
-                tema INTEGER NOT NULL,
-                tema_zodiac TEXT NOT NULL,
-                open_time TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # User settings table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_settings (
-                user_id INTEGER PRIMARY KEY,
-                notify_enabled INTEGER DEFAULT 1,           -- 开奖通知开关
-                reminder_enabled INTEGER DEFAULT 0,         -- 21:00开奖提醒
-                auto_predict_reminder INTEGER DEFAULT 1,    -- 新期号发布时提醒预测
-                auto_predict INTEGER DEFAULT 0,             -- 开奖后自动预测（暂未实现）
-                default_period INTEGER DEFAULT 50,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Prediction history table (legacy - kept for backward compatibility)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS prediction_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                expect TEXT NOT NULL,
-                predicted_top5 TEXT NOT NULL,
-                actual_tema INTEGER,
-                is_hit INTEGER DEFAULT 0,
-                hit_rank INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Prediction records table (new enhanced version)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS prediction_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                expect TEXT UNIQUE NOT NULL,
-                predict_zodiac1 TEXT NOT NULL,
-                predict_zodiac2 TEXT NOT NULL,
-                predict_numbers1 TEXT NOT NULL,
-                predict_numbers2 TEXT NOT NULL,
-                predict_score1 REAL NOT NULL,
-                predict_score2 REAL NOT NULL,
-                predict_time DATETIME NOT NULL,
-                actual_tema INTEGER,
-                actual_zodiac TEXT,
-                is_hit INTEGER DEFAULT 0,
-                hit_rank INTEGER,
-                analysis_data TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create indices for prediction_records
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pred_expect ON prediction_records(expect)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pred_is_hit ON prediction_records(is_hit)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pred_time ON prediction_records(predict_time DESC)')
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Lottery history table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS lottery_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    expect TEXT UNIQUE NOT NULL,
+                    open_code BLOB NOT NULL,                    -- 7 个号码，每个 1 字节
+                    tema INTEGER NOT NULL,
+                    tema_zodiac TEXT NOT NULL,
+                    open_time TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # User settings table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_settings (
+                    user_id INTEGER PRIMARY KEY,
+                    notify_enabled INTEGER DEFAULT 1,           -- 开奖通知开关
+                    reminder_enabled INTEGER DEFAULT 0,         -- 21:00开奖提醒
+                    auto_predict_reminder INTEGER DEFAULT 1,    -- 新期号发布时提醒预测
+                    auto_predict INTEGER DEFAULT 0,             -- 开奖后自动预测（暂未实现）
+                    default_period INTEGER DEFAULT 50,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Prediction history table (legacy - kept for backward compatibility)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS prediction_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    expect TEXT NOT NULL,
+                    predicted_top5 BLOB NOT NULL,               -- 5 个号码，每个 1 字节（旧数据为 JSON 文本）
+                    actual_tema INTEGER,
+                    is_hit INTEGER DEFAULT 0,
+                    hit_rank INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Prediction records table (new enhanced version)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS prediction_records (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    expect TEXT UNIQUE NOT NULL,
+                    predict_zodiac1 TEXT NOT NULL,
+                    predict_zodiac2 TEXT NOT NULL,
+                    predict_numbers1 TEXT NOT NULL,
+                    predict_numbers2 TEXT NOT NULL,
+                    predict_score1 REAL NOT NULL,
+                    predict_score2 REAL NOT NULL,
+                    predict_time DATETIME NOT NULL,
+                    actual_tema INTEGER,
+                    actual_zodiac TEXT,
+                    is_hit INTEGER DEFAULT 0,
+                    hit_rank INTEGER,
+                    analysis_data TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Covering index: history queries are answered from index pages only
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_lh_cover
+                ON lottery_history(expect DESC, open_code, tema, tema_zodiac, open_time)
+            ''')
+            
+            # Partial indexes: notify/reminder user lists scan only enabled users
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_us_notify
+                ON user_settings(user_id) WHERE notify_enabled = 1
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_us_reminder
+                ON user_settings(user_id) WHERE reminder_enabled = 1
+            ''')
+            
+            # Create indices for prediction_records
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pred_expect ON prediction_records(expect)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pred_is_hit ON prediction_records(is_hit)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pred_time ON prediction_records(predict_time DESC)')
+            
+            self._migrate_open_code_blob(cursor)
         logger.info("Database initialized successfully")
     
+    def _migrate_open_code_blob(self, cursor: sqlite3.Cursor):
+        """Rewrite legacy JSON/CSV open_code text as compact byte blobs"""
+        cursor.execute("SELECT id, open_code FROM lottery_history WHERE typeof(open_code) = 'text'")
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        
+        cursor.executemany(
+            'UPDATE lottery_history SET open_code = ? WHERE id = ?',
+            [(self._encode_open_code(self._decode_open_code(row['open_code'])), row['id']) for row in rows]
+        )
+        logger.info(f"Migrated {len(rows)} open_code rows to BLOB storage")
+    
+    @staticmethod
+    def _encode_open_code(open_code: List[int]) -> bytes:
+        """Pack open code numbers (1-49) into one byte each"""
+        return bytes(open_code)
+    
+    @staticmethod
+    def _decode_open_code(value) -> List[int]:
+        """Unpack open code from BLOB (legacy JSON/CSV text still accepted)"""
+        if isinstance(value, bytes):
+            return list(value)
+        if value.strip().startswith('['):
+            return json.loads(value)
+        return parse_open_code(value)
+    
+    @staticmethod
+    def _normalize_zodiac(tema_zodiac: str) -> str:
+        """繁体转简体"""
+        return tema_zodiac.replace("龍", "龙").replace("馬", "马").replace("豬", "猪").replace("雞", "鸡")
+    
     def save_lottery_result(self, expect: str, open_code: List[int], tema: int, tema_zodiac: str, open_time: str):
         """Save lottery result to database"""
-        # 繁体转简体
-        tema_zodiac = tema_zodiac.replace("龍", "龙").replace("馬", "马").replace("豬", "猪").replace("雞", "鸡")
+        tema_zodiac = self._normalize_zodiac(tema_zodiac)
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        ...
+        with self._acquire() as conn:
+            try:
+                conn.execute(_SQL_SAVE_LOTTERY, (expect, self._encode_open_code(open_code), tema, tema_zodiac, open_time))
+                self._notify_history_changed()
+                logger.info(f"Saved lottery result: {expect}")
+                return True
+            except Exception as e:
+                logger.error(f"Error saving lottery result: {e}")
+                return False
+    
+    def save_lottery_results_bulk(self, results: List[Dict]) -> int:
+        """Save many lottery results in a single transaction"""
+        rows = [
+            (r['expect'], self._encode_open_code(r['open_code']), r['tema'],
+             self._normalize_zodiac(r['tema_zodiac']), r['open_time'])
+            for r in results
+        ]
         
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO lottery_history 
-                (expect, open_code, tema, tema_zodiac, open_time)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (expect, json.dumps(open_code), tema, tema_zodiac, open_time))
-            conn.commit()
-            logger.info(f"Saved lottery result: {expect}")
-            return True
+            with self._transaction() as conn:
+                conn.executemany(_SQL_SAVE_LOTTERY, rows)
         except Exception as e:
-            logger.error(f"Error saving lottery result: {e}")
-            return False
-        finally:
-            conn.close()
+            logger.error(f"Error saving lottery results: {e}")
+            return 0
+        
+        self._notify_history_changed()
+        logger.info(f"Saved {len(rows)} lottery results")
+        return len(rows)
     
     def get_latest_result(self) -> Optional[Dict]:
         """Get latest lottery result"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM lottery_history ORDER BY expect DESC LIMIT 1')
-        row = cursor.fetchone()
-        conn.close()
+        if self._latest is not None:
+            return dict(self._latest)
+        
+        version = self._history_version
+        with self._acquire() as conn:
+            row = conn.execute(_SQL_LATEST).fetchone()
         
         if row:
-            return {
+            latest = {
                 'expect': row['expect'],
-            'open_code': (
-                json.loads(row['open_code']) if row['open_code'].strip().startswith('[') 
-                else [int(x.strip()) for x in row['open_code'].split(',')]
-            ),
+                'open_code': self._decode_open_code(row['open_code']),
                 'tema': row['tema'],
-                'tema_zodiac': row['tema_zodiac'],
+                'tema_zodiac': _ZODIAC_INTERN.get(row['tema_zodiac'], row['tema_zodiac']),
                 'open_time': row['open_time']
             }
+            if version == self._history_version:
+                self._latest = latest
+            return dict(latest)
         return None
     
     def get_history(self, limit: int = 10) -> List[Dict]:
-        """Get lottery history"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM lottery_history ORDER BY expect DESC LIMIT ?', (limit,))
-        rows = cursor.fetchall()
-        conn.close()
+        """Get lottery history
+        
+        Rows are copies of the cached ones, so callers may modify them;
+        the open_code lists are shared and must not be changed in place.
+        """
+        cached = self._history_cache.get(limit)
+        if cached is not None:
+            return [dict(r) for r in cached]
+        
+        version = self._history_version
+        with self._acquire() as conn:
+            rows = conn.execute(_SQL_HISTORY, (limit,)).fetchall()
         
         results = []
         for row in rows:
             results.append({
                 'expect': row['expect'],
-            'open_code': json.loads(row['open_code']) if row['open_code'].startswith('[') else [int(x) for x in row['open_code'].split(',')],
+                'open_code': self._decode_open_code(row['open_code']),
                 'tema': row['tema'],
-                'tema_zodiac': row['tema_zodiac'],
+                'tema_zodiac': _ZODIAC_INTERN.get(row['tema_zodiac'], row['tema_zodiac']),
                 'open_time': row['open_time']
             })
-        return results
+        if version == self._history_version:
+            self._history_cache[limit] = results
+        return [dict(r) for r in results]
+    
+    def get_history_arrays(self, limit: int = 10) -> Tuple[array.array, array.array]:
+        """Get tema numbers and zodiac ids (-1 = unknown) of recent draws as int8 arrays"""
+        cached = self._history_arrays_cache.get(limit)
+        if cached is not None:
+            return cached
+        
+        version = self._history_version
+        history = self.get_history(limit)
+        # 列式存储，供数值内核直接使用（np.asarray 零拷贝）
+        tema = array.array('b', [h['tema'] for h in history])
+        zodiac_ids = array.array('b', [ZODIAC_INDEX.get(h['tema_zodiac'], -1) for h in history])
+        if version == self._history_version:
+            self._history_arrays_cache[limit] = (tema, zodiac_ids)
+        return tema, zodiac_ids
+    
+    def count_history(self) -> int:
+        """Number of draws stored in lottery history"""
+        with self._acquire() as conn:
+            return conn.execute('SELECT COUNT(*) FROM lottery_history').fetchone()[0]
     
     def is_database_empty(self) -> bool:
         """Check if lottery history database is empty"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) as count FROM lottery_history')
-        count = cursor.fetchone()['count']
-        conn.close()
+        with self._acquire() as conn:
+            count = conn.execute('SELECT COUNT(*) as count FROM lottery_history').fetchone()['count']
         return count == 0
     
     def get_user_settings(self, user_id: int) -> Dict:
         """Get user settings"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM user_settings WHERE user_id = ?', (user_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with self._acquire() as conn:
+            row = conn.execute(_SQL_USER_SETTINGS, (user_id,)).fetchone()
         
         if row:
             return dict(row)
@@ -295,14 +840,18 @@ class DatabaseHandler:
     
     def create_user_settings(self, user_id: int) -> Dict:
         """Create default user settings"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO user_settings (user_id) VALUES (?)
-        ''', (user_id,))
-        conn.commit()
-        conn.close()
-        return self.get_user_settings(user_id)
+        # RETURNING 直接带回默认值，无需再查询一次
+        with self._acquire() as conn:
+            rows = conn.execute('''
+                INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)
+                RETURNING *
+            ''', (user_id,)).fetchall()
+            if not rows:
+                # 已被并发创建
+                rows = conn.execute(_SQL_USER_SETTINGS, (user_id,)).fetchall()
+            else:
+                self._sync_user_caches(user_id, rows[0]['notify_enabled'] == 1, rows[0]['reminder_enabled'] == 1)
+        return dict(rows[0])
     
     def update_user_setting(self, user_id: int, setting: str, value: int):
         """Update user setting with secure column validation"""
@@ -321,126 +870,147 @@ class DatabaseHandler:
         # Use validated column name
         column_name = allowed_settings[setting]
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        query = f'UPDATE user_settings SET {column_name} = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?'
-        cursor.execute(query, (value, user_id))
-        conn.commit()
-        conn.close()
+        with self._acquire() as conn:
+            query = f'UPDATE user_settings SET {column_name} = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?'
+            updated = conn.execute(query, (value, user_id)).rowcount
+        
+        if not updated:
+            return
+        if column_name == 'notify_enabled':
+            self._sync_user_caches(user_id, notify=value == 1)
+        elif column_name == 'reminder_enabled':
+            self._sync_user_caches(user_id, reminder=value == 1)
+    
+    def toggle_user_setting(self, user_id: int, setting: str) -> Dict:
+        """Flip an on/off setting in one UPDATE ... RETURNING and return the new settings row"""
+        query = _SQL_TOGGLE_SETTING.get(setting)
+        if query is None:
+            raise ValueError(f"Invalid setting: {setting}")
+        
+        with self._acquire() as conn:
+            row = conn.execute(query, (user_id,)).fetchone()
+        if row is None:
+            # 用户尚无设置行：先建默认设置再切换
+            self.create_user_settings(user_id)
+            with self._acquire() as conn:
+                row = conn.execute(query, (user_id,)).fetchone()
+        
+        if setting == 'notify_enabled':
+            self._sync_user_caches(user_id, notify=row[setting] == 1)
+        elif setting == 'reminder_enabled':
+            self._sync_user_caches(user_id, reminder=row[setting] == 1)
+        return dict(row)
+    
+    def disable_notifications(self, user_ids: List[int]):
+        """Turn off draw notifications for users in one transaction"""
+        if not user_ids:
+            return
+        # 逐行绑定参数，不受 SQLite 单条语句变量数上限影响
+        with self._transaction() as conn:
+            conn.executemany(
+                'UPDATE user_settings SET notify_enabled = 0, '
+                'updated_at = CURRENT_TIMESTAMP WHERE user_id = ?',
+                [(user_id,) for user_id in user_ids]
+            )
+        for user_id in user_ids:
+            self._sync_user_caches(user_id, notify=False)
+    
+    def _sync_user_caches(self, user_id: int, notify: Optional[bool] = None, reminder: Optional[bool] = None):
+        """Apply one user's switch change to the loaded notify/reminder user sets"""
+        for users, enabled in ((self._notify_users, notify), (self._reminder_users, reminder)):
+            if users is None or enabled is None:
+                continue
+            if enabled:
+                users.add(user_id)
+            else:
+                users.discard(user_id)
     
     def save_prediction(self, expect: str, predicted_top5: List[int], actual_tema: Optional[int] = None):
         """Save prediction to database"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         is_hit = 0
         hit_rank = None
         if actual_tema and actual_tema in predicted_top5:
             is_hit = 1
             hit_rank = predicted_top5.index(actual_tema) + 1
         
-        cursor.execute('''
-            INSERT INTO prediction_history 
-            (expect, predicted_top5, actual_tema, is_hit, hit_rank)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (expect, json.dumps(predicted_top5), actual_tema, is_hit, hit_rank))
-        conn.commit()
-        conn.close()
+        with self._acquire() as conn:
+            conn.execute('''
+                INSERT INTO prediction_history 
+                (expect, predicted_top5, actual_tema, is_hit, hit_rank)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (expect, self._encode_open_code(predicted_top5), actual_tema, is_hit, hit_rank))
+    
     def get_result_by_expect(self, expect: str) -> Optional[Dict]:
         """Get lottery result by expect number"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # 规范化期号（支持 '038' 或 '2026038' 格式）
-        if len(expect) == 3:
-            # 如果是3位数，需要匹配后3位
-            cursor.execute("""
-                SELECT expect, open_code, tema, tema_zodiac, open_time 
-                FROM lottery_history 
-                WHERE expect LIKE ?
-                ORDER BY expect DESC
-                LIMIT 1
-            """, (f'%{expect}',))
-        else:
-            # 完整期号直接查询
-            cursor.execute("""
-                SELECT expect, open_code, tema, tema_zodiac, open_time 
-                FROM lottery_history 
-                WHERE expect = ?
-            """, (expect,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        with self._acquire() as conn:
+            cursor = conn.cursor()
+            
+            # 规范化期号（支持 '038' 或 '2026038' 格式）
+            if len(expect) == 3:
+                # 如果是3位数，需要匹配后3位
+                cursor.execute(_SQL_RESULT_BY_SUFFIX, (f'%{expect}',))
+            else:
+                # 完整期号直接查询
+                cursor.execute(_SQL_RESULT_BY_EXPECT, (expect,))
+            
+            row = cursor.fetchone()
         
         if row:
             return {
                 'expect': row['expect'],
-                'open_code': json.loads(row['open_code']),  # 这里是 JSON 字符串
+                'open_code': self._decode_open_code(row['open_code']),
                 'tema': row['tema'],
-                'tema_zodiac': row['tema_zodiac'],
+                'tema_zodiac': _ZODIAC_INTERN.get(row['tema_zodiac'], row['tema_zodiac']),
                 'open_time': row['open_time']
             }
         return None
     
     def get_all_notify_users(self) -> List[int]:
         """Get all users with notifications enabled"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT user_id FROM user_settings WHERE notify_enabled = 1')
-        users = [row['user_id'] for row in cursor.fetchall()]
-        conn.close()
-        return users
+        if self._notify_users is None:
+            with self._acquire() as conn:
+                rows = conn.execute(_SQL_NOTIFY_USERS).fetchall()
+            self._notify_users = {row['user_id'] for row in rows}
+        return sorted(self._notify_users)
     
     def get_all_reminder_users(self) -> List[int]:
         """Get all users with reminders enabled"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT user_id FROM user_settings WHERE reminder_enabled = 1')
-        users = [row['user_id'] for row in cursor.fetchall()]
-        conn.close()
-        return users
+        if self._reminder_users is None:
+            with self._acquire() as conn:
+                rows = conn.execute(_SQL_REMINDER_USERS).fetchall()
+            self._reminder_users = {row['user_id'] for row in rows}
+        return sorted(self._reminder_users)
     
     def can_predict(self, expect: str) -> bool:
         """Check if prediction is allowed for this period"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id FROM prediction_records WHERE expect = ?', (expect,))
-        result = cursor.fetchone()
-        conn.close()
+        with self._acquire() as conn:
+            result = conn.execute(_SQL_CAN_PREDICT, (expect,)).fetchone()
         return result is None
     
     def save_zodiac_prediction(self, expect: str, zodiac1: str, zodiac2: str, 
                                numbers1: List[int], numbers2: List[int],
                                score1: float, score2: float, analysis_data: Dict) -> bool:
         """Save zodiac prediction to database"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT INTO prediction_records 
-                (expect, predict_zodiac1, predict_zodiac2, predict_numbers1, predict_numbers2,
-                 predict_score1, predict_score2, predict_time, analysis_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), ?)
-            ''', (expect, zodiac1, zodiac2, 
-                  ','.join(map(str, numbers1)), ','.join(map(str, numbers2)),
-                  score1, score2, json.dumps(analysis_data, ensure_ascii=False)))
-            conn.commit()
-            logger.info(f"Saved zodiac prediction for {expect}: {zodiac1}, {zodiac2}")
-            return True
-        except Exception as e:
-            logger.error(f"Error saving zodiac prediction: {e}")
-            return False
-        finally:
-            conn.close()
+        with self._acquire() as conn:
+            try:
+                conn.execute('''
+                    INSERT INTO prediction_records 
+                    (expect, predict_zodiac1, predict_zodiac2, predict_numbers1, predict_numbers2,
+                     predict_score1, predict_score2, predict_time, analysis_data)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), ?)
+                ''', (expect, zodiac1, zodiac2, 
+                      ','.join(map(str, numbers1)), ','.join(map(str, numbers2)),
+                      score1, score2, json.dumps(analysis_data, ensure_ascii=False)))
+                logger.info(f"Saved zodiac prediction for {expect}: {zodiac1}, {zodiac2}")
+                return True
+            except Exception as e:
+                logger.error(f"Error saving zodiac prediction: {e}")
+                return False
     
     def get_prediction_record(self, expect: str) -> Optional[Dict]:
         """Get prediction record for a specific period"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM prediction_records WHERE expect = ?', (expect,))
-        row = cursor.fetchone()
-        conn.close()
+        with self._acquire() as conn:
+            row = conn.execute(_SQL_PREDICTION_RECORD, (expect,)).fetchone()
         
         if row:
             return {
@@ -467,48 +1037,34 @@ class DatabaseHandler:
         for trad, simp in TRADITIONAL_TO_SIMPLIFIED.items():
             actual_zodiac = actual_zodiac.replace(trad, simp)
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get prediction
-        cursor.execute('SELECT predict_zodiac1, predict_zodiac2 FROM prediction_records WHERE expect = ?', (expect,))
-        record = cursor.fetchone()
-        
-        if record:
-            predict1, predict2 = record['predict_zodiac1'], record['predict_zodiac2']
-            
-            # Determine hit status
-            # is_hit: 0 = not yet drawn, 1 = hit, 2 = miss
-            if actual_zodiac == predict1:
-                is_hit, hit_rank = 1, 1
-            elif actual_zodiac == predict2:
-                is_hit, hit_rank = 1, 2
-            else:
-                is_hit, hit_rank = 2, 0
-            
-            # Update record
-            cursor.execute('''
-                UPDATE prediction_records 
-                SET actual_tema = ?, actual_zodiac = ?, is_hit = ?, hit_rank = ?
-                WHERE expect = ?
-            ''', (actual_tema, actual_zodiac, is_hit, hit_rank, expect))
-            conn.commit()
-            logger.info(f"Updated prediction result for {expect}: {'HIT' if is_hit == 1 else 'MISS'}")
-        
-        conn.close()
+        # is_hit: 0 = not yet drawn, 1 = hit, 2 = miss
+        # 命中判定在 SQL 内完成，一次 UPDATE 即可
+        with self._acquire() as conn:
+            rows = conn.execute('''
+                UPDATE prediction_records
+                SET actual_tema = :tema,
+                    actual_zodiac = :zodiac,
+                    is_hit = CASE WHEN :zodiac IN (predict_zodiac1, predict_zodiac2) THEN 1 ELSE 2 END,
+                    hit_rank = CASE WHEN :zodiac = predict_zodiac1 THEN 1
+                                    WHEN :zodiac = predict_zodiac2 THEN 2
+                                    ELSE 0 END
+                WHERE expect = :expect
+                RETURNING is_hit
+            ''', {'tema': actual_tema, 'zodiac': actual_zodiac, 'expect': expect}).fetchall()
+        
+        if rows:
+            self._hit_rate = None
+            logger.info(f"Updated prediction result for {expect}: {'HIT' if rows[0]['is_hit'] == 1 else 'MISS'}")
     
     def get_prediction_history(self, limit: int = 10) -> List[Dict]:
         """Get prediction history (only predictions with actual results)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM prediction_records 
-            WHERE actual_tema IS NOT NULL
-            ORDER BY expect DESC 
-            LIMIT ?
-        ''', (limit,))
-        rows = cursor.fetchall()
-        conn.close()
+        with self._acquire() as conn:
+            rows = conn.execute('''
+                SELECT * FROM prediction_records 
+                WHERE actual_tema IS NOT NULL
+                ORDER BY expect DESC 
+                LIMIT ?
+            ''', (limit,)).fetchall()
         
         results = []
         for row in rows:
@@ -524,42 +1080,32 @@ class DatabaseHandler:
     
     def calculate_hit_rate(self) -> Dict:
         """Calculate prediction hit rate statistics"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Total predictions with actual results (both hits and misses)
-        cursor.execute('SELECT COUNT(*) as total FROM prediction_records WHERE actual_tema IS NOT NULL')
-        total = cursor.fetchone()['total']
-        
-        # Hit count (is_hit = 1 means hit)
-        cursor.execute('SELECT COUNT(*) as hits FROM prediction_records WHERE is_hit = 1')
-        hits = cursor.fetchone()['hits']
-        
-        # Recent 10 periods
-        cursor.execute('''
-            SELECT COUNT(*) as recent_hits 
-            FROM (SELECT * FROM prediction_records WHERE actual_tema IS NOT NULL ORDER BY expect DESC LIMIT 10)
-            WHERE is_hit = 1
-        ''')
-        recent_10_hits = cursor.fetchone()['recent_hits']
-        
-        cursor.execute('SELECT COUNT(*) as recent_total FROM (SELECT * FROM prediction_records WHERE actual_tema IS NOT NULL ORDER BY expect DESC LIMIT 10)')
-        recent_10_total = cursor.fetchone()['recent_total']
-        
-        # Recent 5 periods
-        cursor.execute('''
-            SELECT COUNT(*) as recent_hits 
-            FROM (SELECT * FROM prediction_records WHERE actual_tema IS NOT NULL ORDER BY expect DESC LIMIT 5)
-            WHERE is_hit = 1
-        ''')
-        recent_5_hits = cursor.fetchone()['recent_hits']
-        
-        cursor.execute('SELECT COUNT(*) as recent_total FROM (SELECT * FROM prediction_records WHERE actual_tema IS NOT NULL ORDER BY expect DESC LIMIT 5)')
-        recent_5_total = cursor.fetchone()['recent_total']
-        
-        conn.close()
-        
-        return {
+        if self._hit_rate is not None:
+            return dict(self._hit_rate)
+        
+        # 单次扫描：窗口排名 + 条件聚合，取代六次独立查询
+        with self._acquire() as conn:
+            row = conn.execute('''
+                WITH r AS (
+                    SELECT is_hit, ROW_NUMBER() OVER (ORDER BY expect DESC) AS rn
+                    FROM prediction_records
+                    WHERE actual_tema IS NOT NULL
+                )
+                SELECT
+                    COUNT(*) AS total,
+                    COALESCE(SUM(is_hit = 1), 0) AS hits,
+                    COALESCE(SUM(rn <= 10), 0) AS recent_10_total,
+                    COALESCE(SUM(rn <= 10 AND is_hit = 1), 0) AS recent_10_hits,
+                    COALESCE(SUM(rn <= 5), 0) AS recent_5_total,
+                    COALESCE(SUM(rn <= 5 AND is_hit = 1), 0) AS recent_5_hits
+                FROM r
+            ''').fetchone()
+        
+        total, hits = row['total'], row['hits']
+        recent_10_hits, recent_10_total = row['recent_10_hits'], row['recent_10_total']
+        recent_5_hits, recent_5_total = row['recent_5_hits'], row['recent_5_total']
+        
+        self._hit_rate = {
             'total': total,
             'hits': hits,
             'hit_rate': (hits / total * 100) if total > 0 else 0,
@@ -570,57 +1116,42 @@ class DatabaseHandler:
             'recent_5_total': recent_5_total,
             'recent_5_rate': (recent_5_hits / recent_5_total * 100) if recent_5_total > 0 else 0
         }
+        return dict(self._hit_rate)
 
     
     def can_predict_3in3(self, user_id: int, expect: str, num_groups: int) -> bool:
         """Check if user can predict 3in3 for this period and group count"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT COUNT(*) as count 
-            FROM predictions_3in3 
-            WHERE user_id = ? AND expect = ? AND num_groups = ?
-        ''', (user_id, expect, num_groups))
-        
-        result = cursor.fetchone()
-        conn.close()
+        with self._acquire() as conn:
+            result = conn.execute('''
+                SELECT COUNT(*) as count 
+                FROM predictions_3in3 
+                WHERE user_id = ? AND expect = ? AND num_groups = ?
+            ''', (user_id, expect, num_groups)).fetchone()
         
         return result['count'] == 0
     
     def save_3in3_prediction(self, user_id: int, expect: str, num_groups: int, predictions: list):
         """Save 3in3 prediction to database"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         # Convert predictions to JSON string
         predictions_json = json.dumps(predictions)
         
-        try:
-            cursor.execute('''
-                INSERT INTO predictions_3in3 (user_id, expect, num_groups, predictions)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, expect, num_groups, predictions_json))
-            
-            conn.commit()
-            conn.close()
-            return True
-        except sqlite3.IntegrityError:
-            conn.close()
-            return False
+        with self._acquire() as conn:
+            try:
+                conn.execute('''
+                    INSERT INTO predictions_3in3 (user_id, expect, num_groups, predictions)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, expect, num_groups, predictions_json))
+                return True
+            except sqlite3.IntegrityError:
+                return False
     
     def get_3in3_prediction(self, user_id: int, expect: str, num_groups: int) -> Optional[Dict]:
         """Get 3in3 prediction record"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM predictions_3in3 
-            WHERE user_id = ? AND expect = ? AND num_groups = ?
-        ''', (user_id, expect, num_groups))
-        
-        result = cursor.fetchone()
-        conn.close()
+        with self._acquire() as conn:
+            result = conn.execute('''
+                SELECT * FROM predictions_3in3 
+                WHERE user_id = ? AND expect = ? AND num_groups = ?
+            ''', (user_id, expect, num_groups)).fetchone()
         
         if result:
             return dict(result)
@@ -636,56 +1167,48 @@ class DatabaseHandler:
         actual_balls = result['open_code'][:7]  # First 7 balls
         actual_balls_str = json.dumps(actual_balls)
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get all unchecked predictions for this period
-        cursor.execute('''
-            SELECT * FROM predictions_3in3 
-            WHERE expect = ? AND is_checked = 0
-        ''', (expect,))
-        
-        predictions = cursor.fetchall()
-        
-        for pred in predictions:
-            pred_list = json.loads(pred['predictions'])
-            hit_results = []
+        with self._transaction() as conn:
+            cursor = conn.cursor()
             
-            # Check each group
-            for group in pred_list:
-                predicted_numbers = group[0]  # (numbers, scores)
-                hit_count = sum(1 for num in predicted_numbers if num in actual_balls)
-                hit_results.append({
-                    'numbers': predicted_numbers,
-                    'hit_count': hit_count,
-                    'is_3in3': hit_count == 3
-                })
+            # Get all unchecked predictions for this period
+            cursor.execute('''
+                SELECT * FROM predictions_3in3 
+                WHERE expect = ? AND is_checked = 0
+            ''', (expect,))
             
-            hit_results_json = json.dumps(hit_results)
+            predictions = cursor.fetchall()
             
-            # Update record
-            cursor.execute('''
-                UPDATE predictions_3in3 
-                SET actual_balls = ?, hit_results = ?, is_checked = 1
-                WHERE id = ?
-            ''', (actual_balls_str, hit_results_json, pred['id']))
-        
-        conn.commit()
-        conn.close()
+            for pred in predictions:
+                pred_list = json.loads(pred['predictions'])
+                hit_results = []
+                
+                # Check each group
+                for group in pred_list:
+                    predicted_numbers = group[0]  # (numbers, scores)
+                    hit_count = sum(1 for num in predicted_numbers if num in actual_balls)
+                    hit_results.append({
+                        'numbers': predicted_numbers,
+                        'hit_count': hit_count,
+                        'is_3in3': hit_count == 3
+                    })
+                
+                hit_results_json = json.dumps(hit_results)
+                
+                # Update record
+                cursor.execute('''
+                    UPDATE predictions_3in3 
+                    SET actual_balls = ?, hit_results = ?, is_checked = 1
+                    WHERE id = ?
+                ''', (actual_balls_str, hit_results_json, pred['id']))
     
     def get_3in3_hit_stats(self, user_id: int, num_groups: int) -> Dict:
         """Calculate 3in3 hit rate statistics for specific group count"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM predictions_3in3 
-            WHERE user_id = ? AND num_groups = ? AND is_checked = 1
-            ORDER BY expect DESC
-        ''', (user_id, num_groups))
-        
-        records = cursor.fetchall()
-        conn.close()
+        with self._acquire() as conn:
+            records = conn.execute('''
+                SELECT * FROM predictions_3in3 
+                WHERE user_id = ? AND num_groups = ? AND is_checked = 1
+                ORDER BY expect DESC
+            ''', (user_id, num_groups)).fetchall()
         
         if not records:
             return {
@@ -720,6 +1243,86 @@ class DatabaseHandler:
                 'rate': (recent_5_hits / recent_5_total * 100) if recent_5_total > 0 else 0
             }
         }
+    
+    # Async wrappers: run blocking queries in a worker thread so Telegram
+    # handlers don't stall the event loop
+    
+    async def aget_latest_result(self) -> Optional[Dict]:
+        # 最新一期已缓存在内存里时直接返回，不占用工作线程
+        if self._latest is not None:
+            return dict(self._latest)
+        return await asyncio.to_thread(self.get_latest_result)
+    
+    async def aget_history(self, limit: int = 10) -> List[Dict]:
+        return await asyncio.to_thread(self.get_history, limit)
+    
+    async def acount_history(self) -> int:
+        return await asyncio.to_thread(self.count_history)
+    
+    async def asave_lottery_result(self, expect: str, open_code: List[int], tema: int, tema_zodiac: str, open_time: str):
+        return await asyncio.to_thread(self.save_lottery_result, expect, open_code, tema, tema_zodiac, open_time)
+    
+    async def aget_user_settings(self, user_id: int) -> Dict:
+        return await asyncio.to_thread(self.get_user_settings, user_id)
+    
+    async def aupdate_user_setting(self, user_id: int, setting: str, value: int):
+        return await asyncio.to_thread(self.update_user_setting, user_id, setting, value)
+    
+    async def atoggle_user_setting(self, user_id: int, setting: str) -> Dict:
+        return await asyncio.to_thread(self.toggle_user_setting, user_id, setting)
+    
+    async def adisable_notifications(self, user_ids: List[int]):
+        return await asyncio.to_thread(self.disable_notifications, user_ids)
+    
+    async def asave_prediction(self, expect: str, predicted_top5: List[int], actual_tema: Optional[int] = None):
+        return await asyncio.to_thread(self.save_prediction, expect, predicted_top5, actual_tema)
+    
+    async def aget_result_by_expect(self, expect: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.get_result_by_expect, expect)
+    
+    async def aget_all_notify_users(self) -> List[int]:
+        if self._notify_users is not None:
+            return sorted(self._notify_users)
+        return await asyncio.to_thread(self.get_all_notify_users)
+    
+    async def aget_all_reminder_users(self) -> List[int]:
+        if self._reminder_users is not None:
+            return sorted(self._reminder_users)
+        return await asyncio.to_thread(self.get_all_reminder_users)
+    
+    async def acan_predict(self, expect: str) -> bool:
+        return await asyncio.to_thread(self.can_predict, expect)
+    
+    async def asave_zodiac_prediction(self, **kwargs) -> bool:
+        return await asyncio.to_thread(self.save_zodiac_prediction, **kwargs)
+    
+    async def aget_prediction_record(self, expect: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.get_prediction_record, expect)
+    
+    async def aupdate_prediction_result(self, expect: str, actual_tema: int, actual_zodiac: str):
+        return await asyncio.to_thread(self.update_prediction_result, expect, actual_tema, actual_zodiac)
+    
+    async def aget_prediction_history(self, limit: int = 10) -> List[Dict]:
+        return await asyncio.to_thread(self.get_prediction_history, limit)
+    
+    async def acalculate_hit_rate(self) -> Dict:
+        return await asyncio.to_thread(self.calculate_hit_rate)
+    
+    async def acan_predict_3in3(self, user_id: int, expect: str, num_groups: int) -> bool:
+        return await asyncio.to_thread(self.can_predict_3in3, user_id, expect, num_groups)
+    
+    async def asave_3in3_prediction(self, user_id: int, expect: str, num_groups: int, predictions: list):
+        return await asyncio.to_thread(self.save_3in3_prediction, user_id, expect, num_groups, predictions)
+    
+    async def aget_3in3_prediction(self, user_id: int, expect: str, num_groups: int) -> Optional[Dict]:
+        return await asyncio.to_thread(self.get_3in3_prediction, user_id, expect, num_groups)
+    
+    async def acheck_3in3_results(self, expect: str):
+        return await asyncio.to_thread(self.check_3in3_results, expect)
+    
+    async def aget_3in3_hit_stats(self, user_id: int, num_groups: int) -> Dict:
+        return await asyncio.to_thread(self.get_3in3_hit_stats, user_id, num_groups)
+
 
 class APIHandler:
     """Handle API calls to lottery service"""
@@ -727,49 +1330,77 @@ class APIHandler:
     BASE_URL = "https://macaumarksix.com/api"
     HISTORY_URL = "https://history.macaumarksix.com/history/macaujc2/y"
     
-    @staticmethod
-    def get_latest_result() -> Optional[Dict]:
-        """Get latest lottery result from API"""
+    # 最新结果的条件请求状态：上次响应的 ETag/Last-Modified、原始内容及解析结果
+    _latest_validators: Dict[str, str] = {}
+    _latest_body: Optional[bytes] = None
+    _latest_parsed: Optional[Dict] = None
+    
+    @classmethod
+    def get_latest_result(cls) -> Optional[Dict]:
+        """Get latest lottery result from API
+        
+        Sends the previous ETag/Last-Modified as a conditional GET; a 304
+        or a byte-identical body reuses the last parsed result.
+        """
         try:
-            response = requests.get(f"{APIHandler.BASE_URL}/macaujc2.com", timeout=10)
+            response = SESSION.get(f"{cls.BASE_URL}/macaujc2.com", headers=cls._latest_validators, timeout=10)
+            if response.status_code == 304 and cls._latest_parsed is not None:
+                return dict(cls._latest_parsed)
             response.raise_for_status()
-            data = response.json()
+            body = response.content
+            if body == cls._latest_body and cls._latest_parsed is not None:
+                return dict(cls._latest_parsed)
+            data = json.loads(body)
             
             if data and len(data) > 0:
                 latest = data[0]
-                open_code = [int(x.strip()) for x in latest['openCode'].split(',')]
+                open_code = parse_open_code(latest['openCode'])
                 
                 # Handle zodiac - could be a list or comma-separated string
                 if isinstance(latest.get('zodiac'), list):
                     zodiacs = latest['zodiac']
                 else:
-                    zodiacs = [x.strip() for x in latest.get('zodiac', '').split(',')]
+                    zodiacs = parse_zodiacs(latest.get('zodiac', ''))
                 
                 tema = open_code[6]  # 7th number (index 6)
-                tema_zodiac = zodiacs[6] if len(zodiacs) > 6 else NUMBER_TO_ZODIAC.get(tema, '未知')
+                tema_zodiac = zodiacs[6] if len(zodiacs) > 6 else (get_zodiac_from_number(tema) or '未知')
                 
-                return {
+                result = {
                     'expect': latest['expect'],
                     'open_code': open_code,
                     'tema': tema,
                     'tema_zodiac': tema_zodiac,
                     'open_time': latest['openTime']
                 }
+                validators = {}
+                if response.headers.get('ETag'):
+                    validators['If-None-Match'] = response.headers['ETag']
+                if response.headers.get('Last-Modified'):
+                    validators['If-Modified-Since'] = response.headers['Last-Modified']
+                cls._latest_validators = validators
+                cls._latest_body = body
+                cls._latest_parsed = result
+                return dict(result)
             return None
         except Exception as e:
             logger.error(f"Error fetching latest result: {e}")
             return None
     
-    @staticmethod
-    def get_live_result() -> Optional[Dict]:
+    @classmethod
+    async def aget_latest_result(cls) -> Optional[Dict]:
+        """get_latest_result on a worker thread, keeping the event loop free"""
+        return await asyncio.to_thread(cls.get_latest_result)
+    
+    @classmethod
+    def get_live_result(cls) -> Optional[Dict]:
         """Get live lottery result"""
         try:
-            response = requests.get(f"{APIHandler.BASE_URL}/live2", timeout=10)
+            response = SESSION.get(f"{cls.BASE_URL}/live2", timeout=10)
             response.raise_for_status()
             data = response.json()
             
             if data and 'openCode' in data:
-                open_code = [int(x.strip()) for x in data['openCode'].split(',')]
+                open_code = parse_open_code(data['openCode'])
                 if len(open_code) >= 7:
                     tema = open_code[6]
                     
@@ -778,10 +1409,10 @@ class APIHandler:
                         if isinstance(data['zodiac'], list):
                             zodiacs = data['zodiac']
                         else:
-                            zodiacs = [x.strip() for x in data['zodiac'].split(',')]
-                        tema_zodiac = zodiacs[6] if len(zodiacs) > 6 else NUMBER_TO_ZODIAC.get(tema, '未知')
+                            zodiacs = parse_zodiacs(data['zodiac'])
+                        tema_zodiac = zodiacs[6] if len(zodiacs) > 6 else (get_zodiac_from_number(tema) or '未知')
                     else:
-                        tema_zodiac = NUMBER_TO_ZODIAC.get(tema, '未知')
+                        tema_zodiac = get_zodiac_from_number(tema) or '未知'
                     
                     return {
                         'expect': data['expect'],
@@ -795,11 +1426,16 @@ class APIHandler:
             logger.error(f"Error fetching live result: {e}")
             return None
     
-    @staticmethod
-    def get_history(year: int) -> List[Dict]:
-        """Get historical results for a year"""
+    @classmethod
+    async def aget_live_result(cls) -> Optional[Dict]:
+        """get_live_result on a worker thread, keeping the event loop free"""
+        return await asyncio.to_thread(cls.get_live_result)
+    
+    @classmethod
+    def iter_history(cls, year: int) -> Iterator[Dict]:
+        """Yield historical results for a year one draw at a time"""
         try:
-            response = requests.get(f"{APIHandler.HISTORY_URL}/{year}", timeout=30)
+            response = SESSION.get(f"{cls.HISTORY_URL}/{year}", timeout=30)
             response.raise_for_status()
             data = response.json()
             
@@ -809,40 +1445,47 @@ class APIHandler:
             else:
                 logger.warning(f"Unexpected API response for {year}: {data.get('message', 'Unknown error')}")
                 items = []
-            
-            results = []
-            for item in items:
-                open_code = [int(x.strip()) for x in item['openCode'].split(',')]
-                zodiacs = [x.strip() for x in item['zodiac'].split(',')]
+        except Exception as e:
+            logger.error(f"Error fetching history for {year}: {e}")
+            return
+        
+        for item in items:
+            try:
+                open_code = parse_open_code(item['openCode'])
+                zodiacs = parse_zodiacs(item['zodiac'])
                 
                 tema = open_code[6]  # 7th number (index 6)
                 tema_zodiac = zodiacs[6]  # 7th zodiac
                 
-                results.append({
+                result = {
                     'expect': item['expect'],
                     'open_code': open_code,
                     'tema': tema,
                     'tema_zodiac': tema_zodiac,
                     'open_time': item['openTime']
-                })
-            return results
-        except Exception as e:
-            logger.error(f"Error fetching history for {year}: {e}")
-            return []
+                }
+            except Exception as e:
+                logger.error(f"Error parsing history item for {year}: {e}")
+                continue
+            yield result
+    
+    @classmethod
+    def get_history(cls, year: int) -> List[Dict]:
+        """Get historical results for a year"""
+        return list(cls.iter_history(year))
 
 
 def get_zodiac_from_number(number: int) -> Optional[str]:
     """Get zodiac from number using lookup table"""
-    for zodiac, numbers in ZODIAC_NUMBERS.items():
-        if number in numbers:
-            return zodiac
+    if 0 <= number <= 50:
+        return _NUM2ZOD[number]
     return None
 
 
 def extract_tema_info(open_code: str, zodiac_str: str) -> Dict:
     """Extract tema information with dual verification"""
-    codes = [int(x.strip()) for x in open_code.split(',')]
-    zodiacs = [x.strip() for x in zodiac_str.split(',')]
+    codes = parse_open_code(open_code)
+    zodiacs = parse_zodiacs(zodiac_str)
     
     tema_number = codes[6]  # 7th number (index 6)
     tema_zodiac_api = zodiacs[6]  # API returned zodiac
@@ -869,28 +1512,30 @@ def sync_history_data(db_handler: DatabaseHandler) -> int:
     logger.info("🔄 Starting history data sync...")
     
     total_synced = 0
-    for year in [2024, 2025, 2026]:
-        try:
-            logger.info(f"Fetching {year} data...")
-            results = APIHandler.get_history(year)
-            
-            for result in results:
-                try:
-                    db_handler.save_lottery_result(
-                        expect=result['expect'],
-                        open_code=result['open_code'],
-                        tema=result['tema'],
-                        tema_zodiac=result['tema_zodiac'],
-                        open_time=result['open_time']
-                    )
-                    total_synced += 1
-                except Exception as e:
-                    logger.error(f"Failed to save {result.get('expect', 'unknown')}: {e}")
-            
-            logger.info(f"✅ {year} data synced successfully: {len(results)} records")
-            
-        except Exception as e:
-            logger.error(f"❌ {year} data sync failed: {e}")
+    batch = []
+    years = [2024, 2025, 2026]
+    # 各年份并发拉取，网络等待相互重叠；写入仍按年份顺序分批进行
+    with ThreadPoolExecutor(max_workers=len(years), thread_name_prefix='history') as pool:
+        logger.info(f"Fetching {', '.join(map(str, years))} data...")
+        futures = [(year, pool.submit(APIHandler.get_history, year)) for year in years]
+        for year, future in futures:
+            try:
+                results = future.result()
+                for result in results:
+                    batch.append(result)
+                    # 分批写入
+                    if len(batch) >= HISTORY_SYNC_BATCH_SIZE:
+                        total_synced += db_handler.save_lottery_results_bulk(batch)
+                        batch = []
+                logger.info(f"✅ {year} data fetched successfully: {len(results)} records")
+                
+            except Exception as e:
+                logger.error(f"❌ {year} data sync failed: {e}")
+    
+    if batch:
+        total_synced += db_handler.save_lottery_results_bulk(batch)
+    if total_synced:
+        db_handler.optimize()
     
     logger.info(f"🎉 History data sync completed! Total synced: {total_synced} records")
     return total_synced
@@ -899,12 +1544,32 @@ def sync_history_data(db_handler: DatabaseHandler) -> int:
 class PredictionEngine:
     """AI prediction engine for lottery numbers"""
     
+    # 结果只依赖历史数据的方法才缓存（zodiac/cold 含随机选号，重新预测应得到新结果）
+    CACHEABLE_METHODS = ('comprehensive', 'frequency', 'hot')
+    
     def __init__(self, db_handler: DatabaseHandler):
         self.db = db_handler
+        self._cache: Dict[Tuple[int, str], Tuple[List[int], Dict]] = {}
+        self.db.add_invalidation_callback(self._cache.clear)
+        # 最近100期及其特码列表，按历史版本号复用，各预测方法共用
+        self._working_set: Optional[Tuple[int, List[Dict], List[int]]] = None
+        self._num_zodiac = None
+        if predictor_kernels.NUMPY_AVAILABLE:
+            self._num_zodiac = predictor_kernels.make_number_zodiac(ZODIAC_NUMBERS)
+        if predictor_kernels.NUMBA_AVAILABLE:
+            # 预热 JIT，避免首次预测时的编译延迟
+            predictor_kernels.warmup(self._num_zodiac)
     
     def predict_top5(self, method: str = 'comprehensive') -> Tuple[List[int], Dict]:
         """Predict top 5 tema numbers with scores"""
-        history = self.db.get_history(100)
+        key = None
+        if method in self.CACHEABLE_METHODS:
+            key = (self.db.version, method)
+            cached = self._cache.get(key)
+            if cached:
+                return list(cached[0]), dict(cached[1])
+        
+        history, tema_list = self._get_working_set()
         
         if not history:
             # Random prediction if no history (1-49, excluding 50)
@@ -913,21 +1578,34 @@ class PredictionEngine:
             return top5, scores
         
         if method == 'frequency':
-            return self._predict_by_frequency(history)
+            result = self._predict_by_frequency(tema_list)
         elif method == 'zodiac':
-            return self._predict_by_zodiac(history)
+            result = self._predict_by_zodiac(history)
         elif method == 'hot':
-            return self._predict_hot_numbers(history)
+            result = self._predict_hot_numbers(tema_list)
         elif method == 'cold':
-            return self._predict_cold_numbers(history)
+            result = self._predict_cold_numbers(tema_list)
         else:  # comprehensive
-            return self._predict_comprehensive(history)
+            result = self._predict_comprehensive(history)
+        
+        if key:
+            self._cache[key] = (list(result[0]), dict(result[1]))
+        return result
+    
+    def _get_working_set(self) -> Tuple[List[Dict], List[int]]:
+        """Last 100 draws and their tema numbers, rebuilt only when history changes"""
+        version = self.db.version
+        if self._working_set is None or self._working_set[0] != version:
+            history = self.db.get_history(100)
+            self._working_set = (version, history, [h['tema'] for h in history])
+        return self._working_set[1], self._working_set[2]
     
-    def _predict_by_frequency(self, history: List[Dict]) -> Tuple[List[int], Dict]:
+    def _predict_by_frequency(self, tema_list: List[int]) -> Tuple[List[int], Dict]:
         """Predict based on frequency analysis"""
-        tema_list = [h['tema'] for h in history]
-        counter = Counter(tema_list)
-        most_common = counter.most_common(5)
+        if predictor_kernels.NUMPY_AVAILABLE:
+            most_common = predictor_kernels.most_common(tema_list, 5)
+        else:
+            most_common = Counter(tema_list).most_common(5)
         
         top5 = [num for num, _ in most_common]
         total = sum(count for _, count in most_common)
@@ -950,10 +1628,9 @@ class PredictionEngine:
         zodiac_list_20 = [h['tema_zodiac'] for h in history[:20]]
         short_term_counter = Counter(zodiac_list_20)
         
-        all_zodiacs = list(ZODIAC_NUMBERS.keys())
         zodiac_analysis = {}
         
-        for zodiac in all_zodiacs:
+        for zodiac in ZODIAC_LIST:
             # 计算各周期出现频率
             freq_100 = long_term_counter.get(zodiac, 0)
             freq_50 = mid_term_counter.get(zodiac, 0)
@@ -991,31 +1668,33 @@ class PredictionEngine:
                 'missing': missing_periods
             }
         
-        # 按评分排序
-        sorted_zodiacs = sorted(zodiac_analysis.items(), 
-                              key=lambda x: x[1]['score'], 
-                              reverse=True)
+        # 按评分取前5（nlargest 与 sorted(..., reverse=True)[:5] 结果一致）
+        top_items = heapq.nlargest(5, zodiac_analysis.items(), key=lambda x: x[1]['score'])
         
-        # 选择 TOP 5
-        top5 = []
+        # 选择 TOP 5（从每个生肖的号码中随机选一个）
+        top_zodiacs = [zodiac for zodiac, _ in top_items]
+        if ZODIAC_NUMS_ARR is not None:
+            top5 = predictor_kernels.pick_zodiac_numbers(
+                ZODIAC_NUMS_ARR, ZODIAC_NUM_LEN, [ZODIAC_INDEX[z] for z in top_zodiacs]
+            )
+        else:
+            top5 = [random.choice(ZODIAC_NUMBERS[zodiac]) for zodiac in top_zodiacs]
         scores = {}
         
-        for i, (zodiac, analysis) in enumerate(sorted_zodiacs[:5]):
-            # 从该生肖的号码中选择
-            num = random.choice(ZODIAC_NUMBERS[zodiac])
-            top5.append(num)
-            
+        for i, num in enumerate(top5):
             # 计算显示评分（60-95分）
             display_score = 95 - i * 7  # TOP1=95, TOP2=88, TOP3=81...
             scores[num] = display_score
         
         return top5, scores
     
-    def _predict_hot_numbers(self, history: List[Dict]) -> Tuple[List[int], Dict]:
+    def _predict_hot_numbers(self, tema_list: List[int]) -> Tuple[List[int], Dict]:
         """Predict hot numbers (most recent frequent)"""
-        recent_tema = [h['tema'] for h in history[:30]]
-        counter = Counter(recent_tema)
-        most_common = counter.most_common(5)
+        recent_tema = tema_list[:30]
+        if predictor_kernels.NUMPY_AVAILABLE:
+            most_common = predictor_kernels.most_common(recent_tema, 5)
+        else:
+            most_common = Counter(recent_tema).most_common(5)
         
         top5 = [num for num, _ in most_common]
         total = sum(count for _, count in most_common)
@@ -1023,9 +1702,9 @@ class PredictionEngine:
         
         return top5, scores
     
-    def _predict_cold_numbers(self, history: List[Dict]) -> Tuple[List[int], Dict]:
+    def _predict_cold_numbers(self, tema_list: List[int]) -> Tuple[List[int], Dict]:
         """Predict cold numbers (least appeared)"""
-        tema_list = [h['tema'] for h in history[:50]]
+        tema_list = tema_list[:50]
         counter = Counter(tema_list)
         
         # Find numbers that haven't appeared (1-49 only, 50 is rare special case)
@@ -1038,7 +1717,7 @@ class PredictionEngine:
             scores = {num: 90.0 for num in top5}
         else:
             # Get least common
-            least_common = counter.most_common()[:-6:-1]
+            least_common = heapq.nsmallest(5, reversed(counter.items()), key=lambda x: x[1])
             top5 = [num for num, _ in least_common]
             scores = {num: 70.0 for num in top5}
         
@@ -1055,6 +1734,11 @@ class PredictionEngine:
         
         Note: Predicts only numbers 1-49.
         """
+        if self._num_zodiac is not None:
+            tema, zodiac_ids = self.db.get_history_arrays(100)
+            top5 = predictor_kernels.comprehensive_top5(tema, zodiac_ids[:30], self._num_zodiac)
+            return top5, {num: 95 - i * 7 for i, num in enumerate(top5)}
+        
         all_scores = defaultdict(float)
         
         # 因子1：长期频率分析（30%权重）- 冷号回补理论
@@ -1073,25 +1757,32 @@ class PredictionEngine:
                 all_scores[num] += max(0, score)  # 低于平均才加分
         
         # 因子2：短期遗漏分析（35%权重）
-        recent_20 = [h['tema'] for h in history[:20]]
+        # 单次遍历记录每个号码最近一次出现的位置（0=最新期, 19=第20期）
+        last_seen = [-1] * 50
+        for idx, h in enumerate(history[:20]):
+            t = h['tema']
+            if 0 < t < 50 and last_seen[t] < 0:
+                last_seen[t] = idx
         for num in range(1, 50):
-            if num not in recent_20:
+            last_idx = last_seen[num]
+            if last_idx < 0:
                 all_scores[num] += 35  # 最近20期没出现，满分
             else:
-                # 根据距离现在的位置计算分数
-                last_idx = recent_20.index(num)  # 0=最新期, 19=第20期
                 # 越早出现，分数越高
                 all_scores[num] += (last_idx / 20) * 35
         
         # 因子3：生肖周期分析（25%权重）
-        zodiac_list_30 = [h['tema_zodiac'] for h in history[:30]]
-        zodiac_counter = Counter(zodiac_list_30)
+        zodiac_counts = [0] * len(ZODIAC_LIST)
+        for h in history[:30]:
+            z = ZODIAC_INDEX.get(h['tema_zodiac'], -1)
+            if z >= 0:
+                zodiac_counts[z] += 1
         expected_zodiac_freq = 30 / 12  # 理论平均 2.5 次
         
         for num in range(1, 50):
-            zodiac = NUMBER_TO_ZODIAC.get(num)
-            if zodiac:
-                zodiac_freq = zodiac_counter.get(zodiac, 0)
+            z = NUMBER_TO_ZIDX[num]
+            if z >= 0:
+                zodiac_freq = zodiac_counts[z]
                 # 该生肖出现越少，分数越高
                 if zodiac_freq == 0:
                     all_scores[num] += 25
@@ -1114,9 +1805,9 @@ class PredictionEngine:
                 # 最近5期没出现，加分
                 all_scores[num] += 10
         
-        # 排序取 TOP 5
-        sorted_nums = sorted(all_scores.items(), key=lambda x: x[1], reverse=True)
-        top5 = [num for num, _ in sorted_nums[:5]]
+        # 取 TOP 5
+        top5_items = heapq.nlargest(5, all_scores.items(), key=lambda x: x[1])
+        top5 = [num for num, _ in top5_items]
         
         # 计算显示评分（归一化到 60-95 分）
         scores = {}
@@ -1155,8 +1846,7 @@ class PredictionEngine:
         
         if not history:
             # Random selection if no history
-            all_zodiacs = list(ZODIAC_NUMBERS.keys())
-            selected = random.sample(all_zodiacs, 2)
+            selected = random.sample(ZODIAC_LIST, 2)
             return {
                 'zodiac1': selected[0],
                 'zodiac2': selected[1],
@@ -1167,16 +1857,16 @@ class PredictionEngine:
                 'analysis': {}
             }
         
+        if predictor_kernels.NUMPY_AVAILABLE:
+            _, zodiac_ids = self.db.get_history_arrays(dynamic_period)
+            factor_rows = predictor_kernels.zodiac_factor_table(zodiac_ids, dynamic_period)
+        else:
+            factor_rows = self._zodiac_factor_rows(history, dynamic_period)
+        
         # Build zodiac scores
         zodiac_scores = {}
-        all_zodiacs = list(ZODIAC_NUMBERS.keys())
         
-        for zodiac in all_zodiacs:
-            freq_score = self._calculate_frequency_score(history, zodiac, dynamic_period)
-            missing_score = self._calculate_missing_score(history, zodiac)
-            cycle_score = self._calculate_cycle_score(history, zodiac, dynamic_period)
-            trend_score = self._calculate_trend_score(history, zodiac)
-            
+        for zodiac, (freq_score, missing_score, cycle_score, trend_score) in zip(ZODIAC_LIST, factor_rows):
             # Add small random factor for variation (±5)
             random_factor = random.uniform(-5, 5)
             
@@ -1196,8 +1886,7 @@ class PredictionEngine:
             }
         
         # Get TOP 2
-        sorted_zodiacs = sorted(zodiac_scores.items(), key=lambda x: x[1]['score'], reverse=True)
-        top2 = sorted_zodiacs[:2]
+        top2 = heapq.nlargest(2, zodiac_scores.items(), key=lambda x: x[1]['score'])
         
         zodiac1, analysis1 = top2[0]
         zodiac2, analysis2 = top2[1]
@@ -1219,10 +1908,29 @@ class PredictionEngine:
             }
         }
     
-    def _calculate_frequency_score(self, history: List[Dict], zodiac: str, period: int) -> float:
-        """Calculate frequency score for a zodiac (lower frequency = higher score)"""
+    def _zodiac_factor_rows(self, history: List[Dict], period: int) -> List[Tuple[float, float, float, float]]:
+        """Frequency/missing/cycle/trend scores per zodiac (ZODIAC_LIST order)"""
+        # 一次遍历统计出现次数与首次出现位置，各评分函数只做 O(1) 查找
         zodiac_list = [h['tema_zodiac'] for h in history]
-        count = zodiac_list.count(zodiac)
+        full_counter = Counter(zodiac_list)
+        recent10_counter = Counter(zodiac_list[:10])
+        first_idx = {}
+        for i, z in enumerate(zodiac_list):
+            first_idx.setdefault(z, i)
+        
+        rows = []
+        for zodiac in ZODIAC_LIST:
+            count = full_counter.get(zodiac, 0)
+            rows.append((
+                self._calculate_frequency_score(count, period),
+                self._calculate_missing_score(first_idx.get(zodiac, len(zodiac_list))),
+                self._calculate_cycle_score(count, period),
+                self._calculate_trend_score(recent10_counter.get(zodiac, 0))
+            ))
+        return rows
+    
+    def _calculate_frequency_score(self, count: int, period: int) -> float:
+        """Calculate frequency score for a zodiac (lower frequency = higher score)"""
         expected = period / 12  # Expected frequency for 12 zodiacs
         
         # Score inversely proportional to frequency
@@ -1232,25 +1940,13 @@ class PredictionEngine:
             deviation = expected - count
             return min(100.0, max(0.0, 50.0 + deviation * 5))
     
-    def _calculate_missing_score(self, history: List[Dict], zodiac: str) -> float:
+    def _calculate_missing_score(self, missing_periods: int) -> float:
         """Calculate missing score (longer missing = higher score)"""
-        zodiac_list = [h['tema_zodiac'] for h in history]
-        
-        # Find last appearance
-        try:
-            last_idx = zodiac_list.index(zodiac)
-            missing_periods = last_idx
-        except ValueError:
-            # Not found in history
-            missing_periods = len(zodiac_list)
-        
         # Score based on missing periods
         return min(100.0, missing_periods * 2)
     
-    def _calculate_cycle_score(self, history: List[Dict], zodiac: str, period: int) -> float:
+    def _calculate_cycle_score(self, count: int, period: int) -> float:
         """Calculate cycle score based on theoretical expectation"""
-        zodiac_list = [h['tema_zodiac'] for h in history]
-        count = zodiac_list.count(zodiac)
         expected = period / 12
         
         # Favor zodiacs below expected frequency
@@ -1259,11 +1955,8 @@ class PredictionEngine:
         else:
             return max(0.0, 50.0 - (count - expected) * 5)
     
-    def _calculate_trend_score(self, history: List[Dict], zodiac: str) -> float:
+    def _calculate_trend_score(self, recent_count: int) -> float:
         """Calculate trend score based on recent 10 periods"""
-        recent_10 = [h['tema_zodiac'] for h in history[:10]]
-        recent_count = recent_10.count(zodiac)
-        
         # Favor zodiacs not appearing in recent 10
         if recent_count == 0:
             return 100.0
@@ -1272,41 +1965,29 @@ class PredictionEngine:
     
     def get_zodiac_analysis_details(self, history: List[Dict], zodiac: str) -> Dict:
         """Get detailed analysis for a zodiac"""
-        tema_list = [h['tema'] for h in history]
         zodiac_list = [h['tema_zodiac'] for h in history]
         
-        # Count appearances
-        count = zodiac_list.count(zodiac)
-        
-        # Find missing periods
-        try:
-            last_idx = zodiac_list.index(zodiac)
-            current_missing = last_idx
-        except ValueError:
-            current_missing = len(zodiac_list)
-        
-        # Find all appearances and calculate missing periods between them
-        # Note: zodiac_list is in reverse chronological order (newest first)
-        appearances = []
-        for i, z in enumerate(zodiac_list):
-            if z == zodiac:
-                appearances.append(i)
-        
-        # Calculate missing periods between consecutive appearances
-        if appearances:
-            gaps = []
-            for i in range(len(appearances) - 1):
-                # Since appearances are in reverse order, later appearance has larger index
-                gap = appearances[i+1] - appearances[i] - 1
-                if gap >= 0:  # Only count positive gaps
-                    gaps.append(gap)
-            
-            max_missing = max(gaps) if gaps else current_missing
-            avg_missing = sum(gaps) / len(gaps) if gaps else current_missing
+        if predictor_kernels.NUMPY_AVAILABLE and zodiac in ZODIAC_INDEX:
+            # 生肖编号数组上一次性求出现位置与间隔
+            zodiac_ids = [ZODIAC_INDEX.get(z, -1) for z in zodiac_list]
+            count, current_missing, max_missing, avg_missing = predictor_kernels.gap_stats(
+                zodiac_ids, ZODIAC_INDEX[zodiac])
         else:
-            # Never appeared
-            max_missing = len(zodiac_list)
-            avg_missing = len(zodiac_list)
+            # Find all appearances in one pass; count and current missing follow from it
+            # Note: zodiac_list is in reverse chronological order (newest first)
+            appearances = [i for i, z in enumerate(zodiac_list) if z == zodiac]
+            count = len(appearances)
+            current_missing = appearances[0] if appearances else len(zodiac_list)
+            
+            # Missing periods between consecutive appearances
+            gaps = [later - earlier - 1 for earlier, later in zip(appearances, appearances[1:])]
+            if gaps:
+                max_missing = max(gaps)
+                avg_missing = sum(gaps) / len(gaps)
+            else:
+                # Zero or one appearance: fall back to the current missing streak
+                max_missing = current_missing
+                avg_missing = current_missing
         
         return {
             'count': count,
@@ -1319,16 +2000,25 @@ class PredictionEngine:
     def get_hot_cold_analysis(self, period: int = 30) -> Dict:
         """Get hot and cold numbers analysis (1-49 range)"""
         history = self.db.get_history(period)
-        tema_list = [h['tema'] for h in history]
-        counter = Counter(tema_list)
+        
+        if predictor_kernels.NUMPY_AVAILABLE:
+            # 一次 bincount 完成冷热划分
+            tema_list = [h['tema'] for h in history]
+            hot = predictor_kernels.most_common(tema_list, 10)
+            cold = [(num, 0) for num in predictor_kernels.absent_numbers(tema_list, 1, 50)[:10]]
+            if len(cold) < 10:
+                cold.extend(predictor_kernels.least_common(tema_list, 10)[:(10 - len(cold))])
+            return {'hot': hot, 'cold': cold, 'period': period}
+        
+        counter = Counter(h['tema'] for h in history)
         
         # Hot numbers (top 10)
         hot = counter.most_common(10)
         
         # Cold numbers (bottom 10, excluding 50 as it's extremely rare)
         all_numbers = set(range(1, 50))
-        appeared = set(tema_list)
-        not_appeared = list(all_numbers - appeared)
+        appeared = set(counter)
+        not_appeared = sorted(all_numbers - appeared)
         
         cold = []
         for num in not_appeared[:10]:
@@ -1336,7 +2026,7 @@ class PredictionEngine:
         
         # Add least appeared if not enough
         if len(cold) < 10:
-            least_common = counter.most_common()[:-11:-1]
+            least_common = heapq.nsmallest(10, reversed(counter.items()), key=lambda x: x[1])
             cold.extend(least_common[:(10 - len(cold))])
         
         return {'hot': hot, 'cold': cold, 'period': period}
@@ -1348,7 +2038,7 @@ class PredictionEngine:
         counter = Counter(zodiac_list)
         
         distribution = {}
-        for zodiac in ZODIAC_NUMBERS.keys():
+        for zodiac in ZODIAC_LIST:
             count = counter.get(zodiac, 0)
             percentage = (count / len(zodiac_list) * 100) if zodiac_list else 0
             distribution[zodiac] = {'count': count, 'percentage': percentage}
@@ -1357,28 +2047,25 @@ class PredictionEngine:
     
     def get_missing_analysis(self) -> Dict:
         """Analyze missing numbers (1-49 range)"""
-        history = self.db.get_history(50)
-        tema_list = [h['tema'] for h in history]
-        
-        # Track last appearance
-        last_appearance = {}
-        for idx, tema in enumerate(tema_list):
-            if tema not in last_appearance:
-                last_appearance[tema] = idx
-        
-        # Find missing numbers (1-49 only)
-        all_numbers = set(range(1, 50))
-        missing = []
-        for num in all_numbers:
-            if num not in last_appearance:
-                missing.append((num, 50))  # Not appeared in last 50
-            else:
-                missing.append((num, last_appearance[num]))
+        if predictor_kernels.NUMPY_AVAILABLE:
+            # 编译内核一次扫描得出各号码最近出现位置
+            tema, _ = self.db.get_history_arrays(50)
+            _, first_seen = predictor_kernels.freq_missing(tema, 50)
+            last_seen = [50 if idx < 0 else idx for idx in first_seen.tolist()]
+        else:
+            history = self.db.get_history(50)
+            
+            # Track last appearance in one pass (50 = not appeared in last 50)
+            last_seen = [50] * 50
+            for idx, h in enumerate(history):
+                tema = h['tema']
+                if 0 < tema < 50 and last_seen[tema] == 50:
+                    last_seen[tema] = idx
         
-        # Sort by missing periods
-        missing.sort(key=lambda x: x[1], reverse=True)
+        # Top 15 by missing periods, ties keep number order
+        missing = heapq.nlargest(15, ((num, last_seen[num]) for num in range(1, 50)), key=lambda x: x[1])
         
-        return {'missing': missing[:15]}
+        return {'missing': missing}
 
     def predict_3in3(self, num_groups: int = 1, expect: str = None) -> List[Tuple[List[int], Dict]]:
         """
@@ -1449,23 +2136,24 @@ class PredictionEngine:
         
         # 因子3：生肖均衡（30%权重）
         # 七色球通常会分布不同生肖
-        zodiac_list = []
+        zodiac_counts = [0] * len(ZODIAC_LIST)
+        zodiac_total = 0
         for record in history[:30]:
             open_code = record.get('open_code', [])
             if isinstance(open_code, list):
                 for num in open_code:
                     if 1 <= num <= 49:
-                        zodiac = NUMBER_TO_ZODIAC.get(num)
-                        if zodiac:
-                            zodiac_list.append(zodiac)
+                        z = NUMBER_TO_ZIDX[num]
+                        if z >= 0:
+                            zodiac_counts[z] += 1
+                            zodiac_total += 1
         
-        zodiac_counter = Counter(zodiac_list)
-        expected_zodiac = len(zodiac_list) / 12 if zodiac_list else 1
+        expected_zodiac = zodiac_total / 12 if zodiac_total else 1
         
         for num in range(1, 50):
-            zodiac = NUMBER_TO_ZODIAC.get(num)
-            if zodiac:
-                freq = zodiac_counter.get(zodiac, 0)
+            z = NUMBER_TO_ZIDX[num]
+            if z >= 0:
+                freq = zodiac_counts[z]
                 if freq < expected_zodiac:
                     all_scores[num] += 30
                 else:
@@ -1532,37 +2220,67 @@ class LotteryBot:
         self.predictor_ultimate = PredictionEngineUltimate(self.db)
         self.tz = pytz.timezone(TIMEZONE)
         self.last_expect = None
+        # 分析页面（渲染好的消息）按最新期号缓存，开奖入库后清空
+        self._analysis_cache: Dict[Tuple[str, Optional[str], int], object] = {}
+        # 历史记录页：前10期的行文本预先渲染，按历史版本号复用 (version, rows, 历史总期数)
+        self._history_rows: Optional[Tuple[int, Tuple[str, ...], int]] = None
+        self._check_lock = asyncio.Lock()
+        # 通知群发在后台任务里进行，保留引用防止任务被回收
+        self._background_tasks = set()
+        # 预测计算放到后台线程，不阻塞事件循环；预测会重设全局 random 种子，故单线程串行执行
+        self._predict_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='predict')
+        # 开奖时间只解析一次（当天秒数）；倒计时按秒缓存，同一次回调内多处渲染共用
+        self._lottery_hms = tuple(int(x) for x in LOTTERY_TIME.split(':'))
+        hour, minute, second = self._lottery_hms
+        self._target_sec_of_day = hour * 3600 + minute * 60 + second
+        self._countdown_key = None
+        self._countdown = ''
+        # 时区偏移按小时刷新（夏令时切换都在整点）
+        self._utc_offset = 0
+        self._utc_offset_until = 0
         
     def get_countdown(self) -> str:
         """Get countdown to next lottery time"""
-        now = datetime.now(self.tz)
-        lottery_time_parts = LOTTERY_TIME.split(':')
-        target_time = now.replace(
-            hour=int(lottery_time_parts[0]),
-            minute=int(lottery_time_parts[1]),
-            second=int(lottery_time_parts[2]),
-            microsecond=0
-        )
-        
-        # If already passed today, target tomorrow
-        if now >= target_time:
-            target_time += timedelta(days=1)
-        
-        diff = target_time - now
-        hours, remainder = divmod(diff.seconds, 3600)
+        now = _time.time()
+        key = int(now)
+        if key == self._countdown_key:
+            return self._countdown
+        
+        if key >= self._utc_offset_until:
+            self._utc_offset = datetime.fromtimestamp(key, self.tz).utcoffset().total_seconds()
+            self._utc_offset_until = key - key % 3600 + 3600
+        
+        # Seconds until the next draw; already passed today wraps to tomorrow
+        diff = int((self._target_sec_of_day - (now + self._utc_offset)) % 86400)
+        hours, remainder = divmod(diff, 3600)
         minutes, seconds = divmod(remainder, 60)
         
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        self._countdown = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        self._countdown_key = key
+        return self._countdown
+    
+    async def _cached_analysis(self, name: str, period: int, func, *args):
+        """Return func(*args) computed off the event loop, memoized until the next draw is saved"""
+        key = (name, self.last_expect, period)
+        if key not in self._analysis_cache:
+            self._analysis_cache[key] = await asyncio.to_thread(func, *args)
+        return self._analysis_cache[key]
+    
+    async def _run_prediction(self, func, *args):
+        """Run a CPU-bound prediction on the prediction worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._predict_executor, func, *args)
+    
     @admin_only
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         user = update.effective_user
-        self.db.get_user_settings(user.id)  # Create if not exists
+        await self.db.aget_user_settings(user.id)  # Create if not exists
         
         countdown = self.get_countdown()
         
         # 获取最新开奖结果
-        latest = self.db.get_latest_result()
+        latest = await self.db.aget_latest_result()
         
         message = f"""
 🎰 <b>预测机器人</b> 🎰
@@ -1580,7 +2298,7 @@ class LotteryBot:
             expect = latest['expect']
             open_time = latest.get('open_time', '')
             zodiac = latest.get('tema_zodiac', NUMBER_TO_ZODIAC.get(tema, '未知'))
-            zodiac_emoji = ZODIAC_EMOJI.get(zodiac, '')
+            zodiac_label = ZODIAC_LABEL.get(zodiac, zodiac)
             
             # 格式化开奖时间
             if open_time:
@@ -1595,7 +2313,7 @@ class LotteryBot:
             
             # 格式化七色球（去掉方括号）
             if isinstance(open_code, list):
-                balls_str = ', '.join([f"{str(int(num)).zfill(2)}" for num in open_code])
+                balls_str = ', '.join([TWO_DIGIT[int(num)] for num in open_code])
             else:
                 balls_str = str(open_code).strip('[]')
             
@@ -1603,7 +2321,7 @@ class LotteryBot:
 ➖➖➖➖➖➖➖
 📊 <b>最新开奖（{expect}期）</b>
 
-🎯 <b>特码：{str(int(tema)).zfill(2)}    {zodiac_emoji}{zodiac}</b>
+🎯 <b>特码：{TWO_DIGIT[int(tema)]}    {zodiac_label}</b>
 🎲 <b>七色球：{balls_str}</b>
 📅 <b>时间：{time_str}</b>
 ➖➖➖➖➖➖➖
@@ -1616,26 +2334,7 @@ class LotteryBot:
 请选择功能：
 """
         
-        keyboard = [
-            [
-                InlineKeyboardButton("🎯 智能预测", callback_data="menu_predict"),
-                InlineKeyboardButton("📊 最新开奖", callback_data="latest_result"),
-            ],
-            [
-                InlineKeyboardButton("📈 数据分析", callback_data="menu_analysis"),
-                InlineKeyboardButton("📜 历史记录", callback_data="menu_history"),
-            ],
-            [
-                InlineKeyboardButton("🔮 玄机预测图", callback_data="xuanji_menu"),
-            ],
-            [
-                InlineKeyboardButton("⚙️ 个人设置", callback_data="menu_settings"),
-                InlineKeyboardButton("❓ 帮助", callback_data="help"),
-            ],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        await update.message.reply_text(message, reply_markup=MAIN_MENU_MARKUP, parse_mode='HTML')
     
     @admin_only
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1721,7 +2420,7 @@ class LotteryBot:
     async def show_predict_menu(self, query):
         """Show prediction menu"""
         # Get next period number
-        latest = self.db.get_latest_result()
+        latest = await self.db.aget_latest_result()
         if latest:
             next_expect = str(int(latest['expect']) + 1)
         else:
@@ -1730,106 +2429,63 @@ class LotteryBot:
         countdown = self.get_countdown()
         
         # Check if prediction exists for next period
-        can_predict = self.db.can_predict(next_expect) if latest else False
+        can_predict = await self.db.acan_predict(next_expect) if latest else False
         prediction_status = "未预测" if can_predict else "✅ 已预测（已锁定）"
         
-        message = f"""
-🎯 <b>智能预测菜单</b>
-
-➖➖➖➖➖➖➖
-📅 下期期号：{next_expect}
-⏰ 开奖倒计时：{countdown}
-➖➖➖➖➖➖➖
-🔮 <b>AI 生肖预测（TOP 2）</b> ⭐ 推荐
-
-基于多维度分析预测最可能的2个生肖
-• 频率分析 (30%)
-• 遗漏分析 (30%)
-• 周期分析 (20%)
-• 趋势分析 (20%)
-
-📊 预测状态：{prediction_status}
-➖➖➖➖➖➖➖
-⚠️ 免责声明
-本机器人仅供娱乐和学习参考，预测结果不构成任何投资建议。请理性娱乐，谨慎决策。
-
-⚠️ 预测仅供参考，不保证准确性
-"""
-        
-        keyboard = [
-            [InlineKeyboardButton("🔮 AI 生肖预测（TOP 2）⭐", callback_data="ai_zodiac_predict")],
-            [InlineKeyboardButton("🎲 三中三预测", callback_data="predict_3in3")],
-            [
-                InlineKeyboardButton("🤖 综合预测", callback_data="predict_comprehensive"),
-                InlineKeyboardButton("🐲 生肖预测", callback_data="predict_zodiac"),
-            ],
-            [
-                InlineKeyboardButton("🔥 热号预测", callback_data="predict_hot"),
-                InlineKeyboardButton("❄️ 冷号预测", callback_data="predict_cold"),
-            ],
-            [InlineKeyboardButton("📊 预测历史", callback_data="prediction_history")],
-            [InlineKeyboardButton("🔙 返主菜单", callback_data="back_to_main")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message = PREDICT_MENU_TEMPLATE.format(
+            next_expect=next_expect,
+            countdown=countdown,
+            prediction_status=prediction_status
+        )
         
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        await query.edit_message_text(message, reply_markup=PREDICT_MENU_MARKUP, parse_mode='HTML')
     
     async def show_prediction(self, query, method: str):
         """Show prediction result"""
-        top5, scores = self.predictor.predict_top5(method)
+        top5, scores = await self._run_prediction(self.predictor.predict_top5, method)
         
         # 获取当前期号和下一期（必须在使用前定义！）
-        latest = self.db.get_latest_result()
+        latest = await self.db.aget_latest_result()
         current_expect = latest['expect'] if latest else '未知'
         if latest and latest['expect'].isdigit():
             next_expect = str(int(latest['expect']) + 1)
         else:
             next_expect = '未知'
         
-        method_names = {
-            'comprehensive': 'AI综合预测',
-            'zodiac': '生肖预测',
-            'hot': '热号预测',
-            'cold': '冷号预测',
-            'frequency': '频率预测'
-        }
-        
         # 添加期号显示
-        message = f"🎯 <b>{method_names.get(method, '预测')}</b>\n\n"
-        message += f"📅 当前期号：{current_expect}\n"
-        message += f"🎲 预测期号：<b>{next_expect}</b>\n\n"
-        message += "➖➖➖➖➖➖➖\n"
-        message += "📊 <b>TOP5 特码预测：</b>\n\n"
+        parts = [
+            f"🎯 <b>{PREDICT_METHOD_NAMES.get(method, '预测')}</b>\n\n",
+            f"📅 当前期号：{current_expect}\n",
+            f"🎲 预测期号：<b>{next_expect}</b>\n\n",
+            "➖➖➖➖➖➖➖\n",
+            "📊 <b>TOP5 特码预测：</b>\n\n"
+        ]
         
         for idx, num in enumerate(top5, 1):
-            zodiac = NUMBER_TO_ZODIAC.get(num, '未知')
-            zodiac_emoji = ZODIAC_EMOJI.get(zodiac, '')
+            label = NUMBER_TO_LABEL.get(num, '未知')
             score = scores.get(num, 0)
-            bar = "█" * int(score / 10)
-            message += f"{idx}. 号码 <b>{str(int(num)).zfill(2)}</b> {zodiac_emoji}{zodiac} - {score:.1f}%\n"
-            message += f"   {bar}\n\n"
+            bar = BARS[max(0, min(int(score / 10), 200))]
+            parts.append(f"{idx}. 号码 <b>{TWO_DIGIT[int(num)]}</b> {label} - {score:.1f}%\n")
+            parts.append(f"   {bar}\n\n")
         
         countdown = self.get_countdown()
-        message += "➖➖➖➖➖➖➖\n"
-        message += f"⏰ 距离开奖：<code>{countdown}</code>\n"
-        message += "\n⚠️ <i>预测仅供参考，请理性对待</i>"
+        parts.append("➖➖➖➖➖➖➖\n")
+        parts.append(f"⏰ 距离开奖：<code>{countdown}</code>\n")
+        parts.append("\n⚠️ <i>预测仅供参考，请理性对待</i>")
+        message = "".join(parts)
         
         # Save prediction
         if latest:
-            self.db.save_prediction(next_expect, top5)
+            await self.db.asave_prediction(next_expect, top5)
         
-        keyboard = [
-            [InlineKeyboardButton("🔄 重新预测", callback_data=f"predict_{method}")],
-            [InlineKeyboardButton("🔙 返回预测菜单", callback_data="menu_predict")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = PREDICT_RESULT_MARKUPS.get(method) or _predict_result_markup(method)
         
         await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
     
     async def show_ai_zodiac_predict(self, query):
         """Show AI zodiac prediction interface"""
         # Get next period
-        latest = self.db.get_latest_result()
+        latest = await self.db.aget_latest_result()
         if not latest:
             await query.edit_message_text(
                 "❌ 暂无历史数据，请稍后再试",
@@ -1840,7 +2496,7 @@ class LotteryBot:
         next_expect = str(int(latest['expect']) + 1)
         
         # Check if already predicted
-        if not self.db.can_predict(next_expect):
+        if not await self.db.acan_predict(next_expect):
             # Show existing prediction
             await self.show_existing_zodiac_prediction(query, next_expect)
             return
@@ -1887,9 +2543,9 @@ class LotteryBot:
         await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
     
     async def perform_zodiac_prediction(self, query):
-        """Perform zodiac prediction with animation"""
+        """Perform zodiac prediction"""
         # Get next period
-        latest = self.db.get_latest_result()
+        latest = await self.db.aget_latest_result()
         if not latest:
             await query.answer("❌ 暂无历史数据", show_alert=True)
             return
@@ -1897,7 +2553,7 @@ class LotteryBot:
         next_expect = str(int(latest['expect']) + 1)
         
         # Check if already predicted
-        if not self.db.can_predict(next_expect):
+        if not await self.db.acan_predict(next_expect):
             await query.answer("⚠️ 本期已预测，不可重复预测", show_alert=True)
             await self.show_existing_zodiac_prediction(query, next_expect)
             return
@@ -1907,43 +2563,27 @@ class LotteryBot:
         ranges = {0: 300, 1: 200, 2: 100, 3: 50, 4: 30}
         dynamic_period = ranges[period_num % 5]
         
-        # Show progress animation
+        # Show progress once (the analysis itself takes milliseconds)
         progress_msg = f"""
 ⏳ <b>AI 正在分析历史数据...</b>
 
 ✅ 加载最近{dynamic_period}期历史数据...
+✅ 分析49个号码出现频率...
+✅ 计算12生肖遗漏值...
+✅ 分析生肖周期规律...
+✅ 统计冷热号走势...
+✅ 综合评分排序...
 """
         await query.edit_message_text(progress_msg, parse_mode='HTML')
-        await asyncio.sleep(0.5)
-        
-        progress_msg += "✅ 分析49个号码出现频率...\n"
-        await query.edit_message_text(progress_msg, parse_mode='HTML')
-        await asyncio.sleep(0.5)
-        
-        progress_msg += "✅ 计算12生肖遗漏值...\n"
-        await query.edit_message_text(progress_msg, parse_mode='HTML')
-        await asyncio.sleep(0.5)
-        
-        progress_msg += "✅ 分析生肖周期规律...\n"
-        await query.edit_message_text(progress_msg, parse_mode='HTML')
-        await asyncio.sleep(0.5)
-        
-        progress_msg += "✅ 统计冷热号走势...\n"
-        await query.edit_message_text(progress_msg, parse_mode='HTML')
-        await asyncio.sleep(0.5)
-        
-        progress_msg += "✅ 综合评分排序...\n\n🤖 AI 预测生成完成！"
-        await query.edit_message_text(progress_msg, parse_mode='HTML')
-        await asyncio.sleep(1)
         
         # Perform prediction with ultimate engine (18 dimensions)
-        prediction = self.predictor_ultimate.predict_top2_zodiac(300, next_expect)
+        prediction = await self._run_prediction(self.predictor_ultimate.predict_top2_zodiac, 300, next_expect)
         
         # Get dynamic period from prediction
         dynamic_period = prediction.get('period', 100)
         
         # Save to database
-        self.db.save_zodiac_prediction(
+        await self.db.asave_zodiac_prediction(
             expect=next_expect,
             zodiac1=prediction['zodiac1'],
             zodiac2=prediction['zodiac2'],
@@ -1966,8 +2606,8 @@ class LotteryBot:
         emoji1 = ZODIAC_EMOJI.get(zodiac1, '')
         emoji2 = ZODIAC_EMOJI.get(zodiac2, '')
         
-        numbers1_str = ', '.join(f"{str(int(n)).zfill(2)}" for n in prediction['numbers1'])
-        numbers2_str = ', '.join(f"{str(int(n)).zfill(2)}" for n in prediction['numbers2'])
+        numbers1_str = ', '.join(TWO_DIGIT[int(n)] for n in prediction['numbers1'])
+        numbers2_str = ', '.join(TWO_DIGIT[int(n)] for n in prediction['numbers2'])
         
         score1 = prediction['score1']
         score2 = prediction['score2']
@@ -1977,61 +2617,36 @@ class LotteryBot:
         confidence2 = min(100, score2)
         
         # Get hit rate
-        hit_stats = self.db.calculate_hit_rate()
+        hit_stats = await self.db.acalculate_hit_rate()
         
-        message = f"""
-🎯 <b>AI 生肖预测（TOP 2）</b>
-
-📊 <b>18维度综合分析</b>
-{'═' * 27}
-🥇 第一预测：{emoji1} {zodiac1} (置信度: {confidence1:.1f}%)
-🥈 第二预测：{emoji2} {zodiac2} (置信度: {confidence2:.1f}%)
-
-📈 <b>分析维度：</b>
-✅ 马尔可夫链 | ✅ 傅里叶周期
-✅ 贝叶斯概率 | ✅ 蒙特卡洛验证
-✅ 五行分析   | ✅ 波色分析
-✅ 生肖关系   | ✅ 大小单双
-✅ 遗漏分析   | ✅ 热度分析
-✅ 周期规律   | ✅ 连开惩罚
-✅ 号码冷热   | ✅ 尾数走势
-✅ 质合分析   | ✅ 重复惩罚
-
-🔢 <b>对应号码：</b>
-{zodiac1}：{numbers1_str}
-{zodiac2}：{numbers2_str}
-
-➖➖➖➖➖➖➖
-⏰ 预测时间：{datetime.now(self.tz).strftime('%Y-%m-%d %H:%M:%S')}
+        parts = [
+            ZODIAC_PREDICTION_TEMPLATE.format(
+                emoji1=emoji1, zodiac1=zodiac1, confidence1=confidence1, numbers1=numbers1_str,
+                emoji2=emoji2, zodiac2=zodiac2, confidence2=confidence2, numbers2=numbers2_str
+            ),
+            f"""⏰ 预测时间：{datetime.now(self.tz).strftime('%Y-%m-%d %H:%M:%S')}
 📅 预测期号：{expect}
 📊 开奖倒计时：{countdown}
 📈 分析期数：{dynamic_period}期
 """
+        ]
         
         if hit_stats['total'] > 0:
-            message += f"""
+            parts.append(f"""
 ➖➖➖➖➖➖➖
 📊 <b>历史命中率统计</b>
 
 总预测次数：{hit_stats['total']}期
 命中次数：{hit_stats['hits']}期
 总命中率：{hit_stats['hit_rate']:.1f}% 📈
-"""
+""")
             if hit_stats['recent_10_total'] > 0:
-                message += f"近10期表现：{hit_stats['recent_10_hits']}/{hit_stats['recent_10_total']} = {hit_stats['recent_10_rate']:.1f}%\n"
+                parts.append(f"近10期表现：{hit_stats['recent_10_hits']}/{hit_stats['recent_10_total']} = {hit_stats['recent_10_rate']:.1f}%\n")
             if hit_stats['recent_5_total'] > 0:
-                message += f"近5期表现：{hit_stats['recent_5_hits']}/{hit_stats['recent_5_total']} = {hit_stats['recent_5_rate']:.1f}%\n"
+                parts.append(f"近5期表现：{hit_stats['recent_5_hits']}/{hit_stats['recent_5_total']} = {hit_stats['recent_5_rate']:.1f}%\n")
         
-        message += """
-➖➖➖➖➖➖➖
-⚠️ <b>重要提示</b>
-
-✅ 本期预测已锁定，无法修改
-✅ 开奖后将自动对比结果
-✅ 结果将记录到预测历史
-
-💡 <i>预测仅供参考，请理性对待</i>
-"""
+        parts.append(ZODIAC_PREDICTION_LOCKED_FOOTER)
+        message = "".join(parts)
         
         keyboard = [
             [InlineKeyboardButton("📊 查看预测历史", callback_data="prediction_history")],
@@ -2043,7 +2658,7 @@ class LotteryBot:
     
     async def show_existing_zodiac_prediction(self, query, expect: str):
         """Show existing prediction for a period"""
-        record = self.db.get_prediction_record(expect)
+        record = await self.db.aget_prediction_record(expect)
         
         if not record:
             await query.edit_message_text(
@@ -2063,69 +2678,50 @@ class LotteryBot:
         confidence1 = min(100, record.get('predict_score1', 85.0))
         confidence2 = min(100, record.get('predict_score2', 75.0))
         
-        message = f"""
-🎯 <b>AI 生肖预测（TOP 2）</b>
-
-📊 <b>18维度综合分析</b>
-{'═' * 27}
-🥇 第一预测：{emoji1} {zodiac1} (置信度: {confidence1:.1f}%)
-🥈 第二预测：{emoji2} {zodiac2} (置信度: {confidence2:.1f}%)
-
-📈 <b>分析维度：</b>
-✅ 马尔可夫链 | ✅ 傅里叶周期
-✅ 贝叶斯概率 | ✅ 蒙特卡洛验证
-✅ 五行分析   | ✅ 波色分析
-✅ 生肖关系   | ✅ 大小单双
-✅ 遗漏分析   | ✅ 热度分析
-✅ 周期规律   | ✅ 连开惩罚
-✅ 号码冷热   | ✅ 尾数走势
-✅ 质合分析   | ✅ 重复惩罚
-
-🔢 <b>对应号码：</b>
-{zodiac1}：{record['predict_numbers1']}
-{zodiac2}：{record['predict_numbers2']}
-
-➖➖➖➖➖➖➖
-⏰ 开奖倒计时：{countdown}
+        parts = [ZODIAC_PREDICTION_TEMPLATE.format(
+            emoji1=emoji1, zodiac1=zodiac1, confidence1=confidence1, numbers1=record['predict_numbers1'],
+            emoji2=emoji2, zodiac2=zodiac2, confidence2=confidence2, numbers2=record['predict_numbers2']
+        ), f"""⏰ 开奖倒计时：{countdown}
 📅 预测期号：{expect}
 📊 本期预测状态：<b>✅ 已预测（已锁定）</b>
 📅 预测时间：{record['predict_time']}
 ⏰ 开奖时间：预计 {LOTTERY_TIME}
 
 💡 提示：开奖后将自动对比预测结果
-"""
+"""]
         
         # If already drawn, show comparison
         if record['is_hit'] > 0:
             actual_zodiac = record['actual_zodiac']
             actual_emoji = ZODIAC_EMOJI.get(actual_zodiac, '')
             
-            message += f"""
+            parts.append(f"""
 
 ➖➖➖➖➖➖➖
 🎰 <b>开奖结果对比</b>
 
-实际开出：<b>{record['actual_tema']:02d}</b> {actual_emoji}{actual_zodiac}
+实际开出：<b>{TWO_DIGIT[record['actual_tema']]}</b> {actual_emoji}{actual_zodiac}
 
-"""
+""")
             if record['is_hit'] == 1:
                 if record['hit_rank'] == 1:
-                    message += f"🎉 <b>恭喜！TOP1 生肖预测命中！</b> ✅\n\n"
-                    message += f"预测生肖一：{emoji1} {zodiac1} ✅ 命中！\n"
-                    message += f"预测生肖二：{emoji2} {zodiac2}\n"
+                    parts.append("🎉 <b>恭喜！TOP1 生肖预测命中！</b> ✅\n\n")
+                    parts.append(f"预测生肖一：{emoji1} {zodiac1} ✅ 命中！\n")
+                    parts.append(f"预测生肖二：{emoji2} {zodiac2}\n")
                 else:
-                    message += f"🎊 <b>TOP2 生肖预测命中！</b> ✅\n\n"
-                    message += f"预测生肖一：{emoji1} {zodiac1}\n"
-                    message += f"预测生肖二：{emoji2} {zodiac2} ✅ 命中！\n"
+                    parts.append("🎊 <b>TOP2 生肖预测命中！</b> ✅\n\n")
+                    parts.append(f"预测生肖一：{emoji1} {zodiac1}\n")
+                    parts.append(f"预测生肖二：{emoji2} {zodiac2} ✅ 命中！\n")
             else:
-                message += f"💔 <b>很遗憾，本期预测未中</b>\n\n"
-                message += f"预测生肖一：{emoji1} {zodiac1} ❌\n"
-                message += f"预测生肖二：{emoji2} {zodiac2} ❌\n"
+                parts.append("💔 <b>很遗憾，本期预测未中</b>\n\n")
+                parts.append(f"预测生肖一：{emoji1} {zodiac1} ❌\n")
+                parts.append(f"预测生肖二：{emoji2} {zodiac2} ❌\n")
         
-        message += """
+        parts.append("""
 
 ➖➖➖➖➖➖➖
-"""
+""")
+        message = "".join(parts)
         
         keyboard = [
             [InlineKeyboardButton("📊 查看预测历史", callback_data="prediction_history")],
@@ -2139,7 +2735,7 @@ class LotteryBot:
         from xuanji_scraper import XuanjiImageScraper
         
         # 获取最新期号
-        latest = self.db.get_latest_result()
+        latest = await self.db.aget_latest_result()
         if latest:
             current_expect = int(latest['expect'])
             next_expect = current_expect + 1
@@ -2200,7 +2796,7 @@ class LotteryBot:
             
             # 如果没有指定期数，获取下一期期号
             if not expect:
-                latest = self.db.get_latest_result()
+                latest = await self.db.aget_latest_result()
                 if latest:
                     expect = str(int(latest['expect']) + 1)
                 else:
@@ -2217,7 +2813,7 @@ class LotteryBot:
                 emoji = XuanjiImageScraper.IMAGE_TYPES[image_type]['emoji']
                 
                 # 查询该期的开奖结果
-                period_result = self.db.get_result_by_expect(result_expect)
+                period_result = await self.db.aget_result_by_expect(result_expect)
                 
                 # 构建 caption
                 caption = f"""{emoji} <b>{type_name}玄机图</b>
@@ -2231,7 +2827,7 @@ class LotteryBot:
                     # 处理 opencode 可能是字符串或列表
                     if isinstance(period_result['open_code'], str):
                         if ',' in period_result['open_code']:
-                            open_code_list = [int(x.strip()) for x in period_result['open_code'].split(',')]
+                            open_code_list = parse_open_code(period_result['open_code'])
                         else:
                             open_code_list = json.loads(period_result['open_code'])
                     else:
@@ -2240,8 +2836,8 @@ class LotteryBot:
                     tema_zodiac = period_result.get('tema_zodiac', '')
                     
                     # 格式化号码
-                    main_numbers = [str(n).zfill(2) for n in open_code_list[:6]]
-                    special_number = str(tema).zfill(2) if tema else '?'
+                    main_numbers = [TWO_DIGIT[int(n)] for n in open_code_list[:6]]
+                    special_number = TWO_DIGIT[int(tema)] if tema else '?'
                     
                     caption += f"""
 ➖➖➖➖➖➖➖
@@ -2313,7 +2909,7 @@ class LotteryBot:
         from xuanji_scraper import XuanjiImageScraper
         
         # 获取最近3期的期号
-        latest = self.db.get_latest_result()
+        latest = await self.db.aget_latest_result()
         if latest:
             current_expect = int(latest['expect'])
             # 下一期就是最新的玄机图期数
@@ -2360,7 +2956,7 @@ class LotteryBot:
     async def show_3in3_groups_menu(self, query):
         """Show 3in3 prediction groups selection menu"""
         user_id = query.from_user.id
-        latest = self.db.get_latest_result()
+        latest = await self.db.aget_latest_result()
         if latest:
             next_expect = str(int(latest['expect']) + 1)
         else:
@@ -2369,10 +2965,10 @@ class LotteryBot:
         countdown = self.get_countdown()
         
         # Check prediction status for each group count
-        can_predict_1 = self.db.can_predict_3in3(user_id, next_expect, 1)
-        can_predict_3 = self.db.can_predict_3in3(user_id, next_expect, 3)
-        can_predict_5 = self.db.can_predict_3in3(user_id, next_expect, 5)
-        can_predict_10 = self.db.can_predict_3in3(user_id, next_expect, 10)
+        can_predict_1 = await self.db.acan_predict_3in3(user_id, next_expect, 1)
+        can_predict_3 = await self.db.acan_predict_3in3(user_id, next_expect, 3)
+        can_predict_5 = await self.db.acan_predict_3in3(user_id, next_expect, 5)
+        can_predict_10 = await self.db.acan_predict_3in3(user_id, next_expect, 10)
         
         status_1 = "📝 可预测" if can_predict_1 else "✅ 已预测"
         status_3 = "📝 可预测" if can_predict_3 else "✅ 已预测"
@@ -2432,14 +3028,14 @@ class LotteryBot:
     async def show_3in3_prediction(self, query, num_groups: int):
         """Show 3in3 prediction result with 18-dimensional analysis"""
         user_id = query.from_user.id
-        latest = self.db.get_latest_result()
+        latest = await self.db.aget_latest_result()
         if latest:
             next_expect = str(int(latest['expect']) + 1)
         else:
             next_expect = "未知"
         
         # Check if already predicted
-        if not self.db.can_predict_3in3(user_id, next_expect, num_groups):
+        if not await self.db.acan_predict_3in3(user_id, next_expect, num_groups):
             # Show existing prediction
             await self.show_existing_3in3_prediction(query, user_id, next_expect, num_groups)
             return
@@ -2447,17 +3043,17 @@ class LotteryBot:
         countdown = self.get_countdown()
         
         # Get predictions using ultimate engine
-        predictions = self.predictor_ultimate.predict_3in3(num_groups, next_expect)
+        predictions = await self._run_prediction(self.predictor_ultimate.predict_3in3, num_groups, next_expect)
         
         # Save to database
-        self.db.save_3in3_prediction(user_id, next_expect, num_groups, predictions)
+        await self.db.asave_3in3_prediction(user_id, next_expect, num_groups, predictions)
         
         # Calculate dynamic period for display
         period_num = int(next_expect[-3:])
         ranges = {0: 300, 1: 200, 2: 100, 3: 50, 4: 30}
         dynamic_period = ranges[period_num % 5]
         
-        message = f"""
+        parts = [f"""
 🎲 <b>3中3预测（{next_expect}期）</b>
 
 📊 <b>18维度综合分析</b>
@@ -2479,35 +3075,34 @@ class LotteryBot:
 ➖➖➖➖➖➖➖
 🔢 <b>预测号码组合：</b>
 
-"""
+"""]
         
         for idx, (numbers, analysis) in enumerate(predictions, 1):
             # Get confidence from analysis
             confidence = analysis.get('confidence', 50.0)
             
-            message += f"""<b>第{idx}组</b> (置信度: {confidence:.1f}%)
-"""
+            parts.append(f"""<b>第{idx}组</b> (置信度: {confidence:.1f}%)
+""")
             for num in numbers:
-                zodiac = NUMBER_TO_ZODIAC.get(num, '未知')
-                zodiac_emoji = ZODIAC_EMOJI.get(zodiac, '')
-                message += f"🎯 <b>{str(int(num)).zfill(2)}</b> {zodiac_emoji}{zodiac}\n"
+                label = NUMBER_TO_LABEL.get(num, '未知')
+                parts.append(f"🎯 <b>{TWO_DIGIT[int(num)]}</b> {label}\n")
             
-            message += "➖➖➖➖➖➖➖\n"
+            parts.append("➖➖➖➖➖➖➖\n")
         
-        message += f"""
+        parts.append(f"""
 ⏰ 距离开奖：<code>{countdown}</code>
 
 ✅ <b>预测已保存并锁定</b>
 💡 开奖后将自动统计命中情况
 
 ⚠️ 预测仅供参考，请理性对待
-"""
+""")
         
         # Get hit stats
-        hit_stats = self.db.get_3in3_hit_stats(user_id, num_groups)
+        hit_stats = await self.db.aget_3in3_hit_stats(user_id, num_groups)
         
         if hit_stats['total'] > 0:
-            message += f"""
+            parts.append(f"""
 
 ➖➖➖➖➖➖➖
 📊 <b>{num_groups}组预测历史统计</b>
@@ -2515,9 +3110,11 @@ class LotteryBot:
 总预测：{hit_stats['total']}期
 3中3命中：{hit_stats['hit_3in3']}期
 命中率：{hit_stats['hit_rate']:.1f}% 📈
-"""
+""")
             if hit_stats['recent_5']['total'] > 0:
-                message += f"近5期：{hit_stats['recent_5']['hits']}/{hit_stats['recent_5']['total']} = {hit_stats['recent_5']['rate']:.1f}%\n"
+                parts.append(f"近5期：{hit_stats['recent_5']['hits']}/{hit_stats['recent_5']['total']} = {hit_stats['recent_5']['rate']:.1f}%\n")
+        
+        message = "".join(parts)
         
         keyboard = [
             [InlineKeyboardButton("📊 查看历史统计", callback_data="3in3_history")],
@@ -2528,7 +3125,7 @@ class LotteryBot:
         await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
     async def show_existing_3in3_prediction(self, query, user_id: int, expect: str, num_groups: int):
         """Show existing 3in3 prediction with 18-dimensional analysis"""
-        record = self.db.get_3in3_prediction(user_id, expect, num_groups)
+        record = await self.db.aget_3in3_prediction(user_id, expect, num_groups)
         
         if not record:
             await query.answer("❌ 未找到预测记录", show_alert=True)
@@ -2537,7 +3134,7 @@ class LotteryBot:
         countdown = self.get_countdown()
         predictions = json.loads(record['predictions'])
         
-        message = f"""
+        parts = [f"""
 🎲 <b>3中3预测（{expect}期）</b>
 
 📊 <b>18维度综合分析</b>
@@ -2561,7 +3158,7 @@ class LotteryBot:
 ➖➖➖➖➖➖➖
 🔢 <b>预测号码组合：</b>
 
-"""
+"""]
         
         # Show predictions
         for idx, item in enumerate(predictions, 1):
@@ -2584,58 +3181,59 @@ class LotteryBot:
                 numbers = item if isinstance(item, list) else []
                 confidence = 50.0
             
-            message += f"""<b>第{idx}组</b> (置信度: {confidence:.1f}%)
-"""
+            parts.append(f"""<b>第{idx}组</b> (置信度: {confidence:.1f}%)
+""")
             for num in numbers:
-                zodiac = NUMBER_TO_ZODIAC.get(num, '未知')
-                zodiac_emoji = ZODIAC_EMOJI.get(zodiac, '')
-                message += f"🎯 <b>{str(int(num)).zfill(2)}</b> {zodiac_emoji}{zodiac}\n"
+                label = NUMBER_TO_LABEL.get(num, '未知')
+                parts.append(f"🎯 <b>{TWO_DIGIT[int(num)]}</b> {label}\n")
             
-            message += "➖➖➖➖➖➖➖\n"
+            parts.append("➖➖➖➖➖➖➖\n")
         
         # Check if results are available
         if record['is_checked'] and record['hit_results']:
             actual_balls = json.loads(record['actual_balls'])
             hit_results = json.loads(record['hit_results'])
             
-            message += f"""
+            parts.append(f"""
 
 🎰 <b>开奖结果</b>
 
-七色球：{', '.join(f"{str(int(n)).zfill(2)}" for n in actual_balls)}
+七色球：{', '.join(TWO_DIGIT[int(n)] for n in actual_balls)}
 
 ➖➖➖➖➖➖➖
 📊 <b>命中情况</b>
 
-"""
+""")
             
             has_3in3 = False
             for idx, result in enumerate(hit_results, 1):
-                numbers_str = ', '.join(f"{str(int(n)).zfill(2)}" for n in result['numbers'])
+                numbers_str = ', '.join(TWO_DIGIT[int(n)] for n in result['numbers'])
                 hit_count = result['hit_count']
                 
                 if result['is_3in3']:
-                    message += f"<b>第{idx}组</b> ✅ 3中3！\n"
-                    message += f"预测：{numbers_str}\n"
-                    message += f"命中：{hit_count}/3 🎉\n\n"
+                    parts.append(f"<b>第{idx}组</b> ✅ 3中3！\n")
+                    parts.append(f"预测：{numbers_str}\n")
+                    parts.append(f"命中：{hit_count}/3 🎉\n\n")
                     has_3in3 = True
                 else:
-                    message += f"<b>第{idx}组</b> 命中 {hit_count}/3\n"
-                    message += f"预测：{numbers_str}\n\n"
+                    parts.append(f"<b>第{idx}组</b> 命中 {hit_count}/3\n")
+                    parts.append(f"预测：{numbers_str}\n\n")
             
             if has_3in3:
-                message += "🎊 <b>恭喜！至少一组3中3！</b>\n"
+                parts.append("🎊 <b>恭喜！至少一组3中3！</b>\n")
             else:
-                message += "💔 很遗憾，本期未中3中3\n"
+                parts.append("💔 很遗憾，本期未中3中3\n")
         else:
-            message += f"""
+            parts.append(f"""
 
 ⏰ 距离开奖：<code>{countdown}</code>
 
 💡 开奖后将自动统计命中情况
-"""
+""")
+        
+        parts.append("\n➖➖➖➖➖➖➖\n")
         
-        message += "\n➖➖➖➖➖➖➖\n"
+        message = "".join(parts)
         
         keyboard = [
             [InlineKeyboardButton("📊 查看历史统计", callback_data="3in3_history")],
@@ -2650,76 +3248,78 @@ class LotteryBot:
         user_id = query.from_user.id
         
         # Get stats for all group counts
-        stats_1 = self.db.get_3in3_hit_stats(user_id, 1)
-        stats_3 = self.db.get_3in3_hit_stats(user_id, 3)
-        stats_5 = self.db.get_3in3_hit_stats(user_id, 5)
-        stats_10 = self.db.get_3in3_hit_stats(user_id, 10)
+        stats_1 = await self.db.aget_3in3_hit_stats(user_id, 1)
+        stats_3 = await self.db.aget_3in3_hit_stats(user_id, 3)
+        stats_5 = await self.db.aget_3in3_hit_stats(user_id, 5)
+        stats_10 = await self.db.aget_3in3_hit_stats(user_id, 10)
         
-        message = """
+        parts = ["""
 📊 <b>3中3预测历史统计</b>
 
 ➖➖➖➖➖➖➖
-"""
+"""]
         
         if stats_1['total'] > 0:
-            message += f"""
+            parts.append(f"""
 <b>1组预测</b>
 总预测：{stats_1['total']}期
 3中3命中：{stats_1['hit_3in3']}期
 命中率：{stats_1['hit_rate']:.1f}% 📈
-"""
+""")
             if stats_1['recent_5']['total'] > 0:
-                message += f"近5期：{stats_1['recent_5']['hits']}/{stats_1['recent_5']['total']} = {stats_1['recent_5']['rate']:.1f}%\n"
-            message += "\n➖➖➖➖➖➖➖\n"
+                parts.append(f"近5期：{stats_1['recent_5']['hits']}/{stats_1['recent_5']['total']} = {stats_1['recent_5']['rate']:.1f}%\n")
+            parts.append("\n➖➖➖➖➖➖➖\n")
         
         if stats_3['total'] > 0:
-            message += f"""
+            parts.append(f"""
 <b>3组预测</b>
 总预测：{stats_3['total']}期
 3中3命中：{stats_3['hit_3in3']}期
 命中率：{stats_3['hit_rate']:.1f}% 📈
-"""
+""")
             if stats_3['recent_5']['total'] > 0:
-                message += f"近5期：{stats_3['recent_5']['hits']}/{stats_3['recent_5']['total']} = {stats_3['recent_5']['rate']:.1f}%\n"
-            message += "\n➖➖➖➖➖➖➖\n"
+                parts.append(f"近5期：{stats_3['recent_5']['hits']}/{stats_3['recent_5']['total']} = {stats_3['recent_5']['rate']:.1f}%\n")
+            parts.append("\n➖➖➖➖➖➖➖\n")
         
         if stats_5['total'] > 0:
-            message += f"""
+            parts.append(f"""
 <b>5组预测</b>
 总预测：{stats_5['total']}期
 3中3命中：{stats_5['hit_3in3']}期
 命中率：{stats_5['hit_rate']:.1f}% 📈
-"""
+""")
             if stats_5['recent_5']['total'] > 0:
-                message += f"近5期：{stats_5['recent_5']['hits']}/{stats_5['recent_5']['total']} = {stats_5['recent_5']['rate']:.1f}%\n"
-            message += "\n➖➖➖➖➖➖➖\n"
+                parts.append(f"近5期：{stats_5['recent_5']['hits']}/{stats_5['recent_5']['total']} = {stats_5['recent_5']['rate']:.1f}%\n")
+            parts.append("\n➖➖➖➖➖➖➖\n")
         
         if stats_10['total'] > 0:
-            message += f"""
+            parts.append(f"""
 <b>10组预测</b>
 总预测：{stats_10['total']}期
 3中3命中：{stats_10['hit_3in3']}期
 命中率：{stats_10['hit_rate']:.1f}% 📈
-"""
+""")
             if stats_10['recent_5']['total'] > 0:
-                message += f"近5期：{stats_10['recent_5']['hits']}/{stats_10['recent_5']['total']} = {stats_10['recent_5']['rate']:.1f}%\n"
-            message += "\n➖➖➖➖➖➖➖\n"
+                parts.append(f"近5期：{stats_10['recent_5']['hits']}/{stats_10['recent_5']['total']} = {stats_10['recent_5']['rate']:.1f}%\n")
+            parts.append("\n➖➖➖➖➖➖➖\n")
         
         if all(s['total'] == 0 for s in [stats_1, stats_3, stats_5, stats_10]):
-            message += """
+            parts.append("""
 📝 暂无预测记录
 
 开始预测后，这里将显示详细的命中率统计
 
 ➖➖➖➖➖➖➖
-"""
+""")
         
-        message += """
+        parts.append("""
 💡 <b>说明</b>
 • 每个组数独立统计
 • 只要任意一组3中3即算命中
 • 统计包含所有已开奖期数
-"""
+""")
+        
+        message = "".join(parts)
         
         keyboard = [
             [InlineKeyboardButton("🔙 返回", callback_data="predict_3in3")],
@@ -2730,8 +3330,8 @@ class LotteryBot:
     
     async def show_prediction_history(self, query):
         """Show prediction history with hit rate"""
-        records = self.db.get_prediction_history(10)
-        hit_stats = self.db.calculate_hit_rate()
+        records = await self.db.aget_prediction_history(10)
+        hit_stats = await self.db.acalculate_hit_rate()
         
         if not records:
             message = """
@@ -2743,7 +3343,7 @@ class LotteryBot:
 请先进行预测后查看
 """
         else:
-            message = f"""
+            parts = [f"""
 📊 <b>预测历史记录</b>
 
 ➖➖➖➖➖➖➖
@@ -2753,38 +3353,41 @@ class LotteryBot:
 命中次数：{hit_stats['hits']}期
 总命中率：{hit_stats['hit_rate']:.1f}% 📈
 
-"""
+"""]
             
             if hit_stats['recent_10_total'] > 0:
-                message += f"\n近10期表现：{hit_stats['recent_10_hits']}/{hit_stats['recent_10_total']} = {hit_stats['recent_10_rate']:.1f}%"
+                parts.append(f"\n近10期表现：{hit_stats['recent_10_hits']}/{hit_stats['recent_10_total']} = {hit_stats['recent_10_rate']:.1f}%")
             if hit_stats['recent_5_total'] > 0:
-                message += f"\n近5期表现：{hit_stats['recent_5_hits']}/{hit_stats['recent_5_total']} = {hit_stats['recent_5_rate']:.1f}%"
+                parts.append(f"\n近5期表现：{hit_stats['recent_5_hits']}/{hit_stats['recent_5_total']} = {hit_stats['recent_5_rate']:.1f}%")
             
-            message += """
+            parts.append("""
 
 ➖➖➖➖➖➖➖
 📅 <b>最近预测记录</b>
 
-"""
+""")
             
             for record in records[:10]:
                 z1 = record['predict_zodiac1']
                 z2 = record['predict_zodiac2']
-                emoji1 = ZODIAC_EMOJI.get(z1, '')
-                emoji2 = ZODIAC_EMOJI.get(z2, '')
+                actual = record['actual_zodiac']
+                label1 = ZODIAC_LABEL.get(z1, z1)
+                label2 = ZODIAC_LABEL.get(z2, z2)
+                actual_label = ZODIAC_LABEL.get(actual, actual)
                 
                 result_str = ""
                 if record['is_hit'] == 1:
                     if record['hit_rank'] == 1:
-                        result_str = f"✅ TOP1命中（{ZODIAC_EMOJI.get(record['actual_zodiac'], '')}{record['actual_zodiac']}）"
+                        result_str = f"✅ TOP1命中（{actual_label}）"
                     else:
-                        result_str = f"✅ TOP2命中（{ZODIAC_EMOJI.get(record['actual_zodiac'], '')}{record['actual_zodiac']}）"
+                        result_str = f"✅ TOP2命中（{actual_label}）"
                 else:
-                    result_str = f"❌ 未中（{ZODIAC_EMOJI.get(record['actual_zodiac'], '')}{record['actual_zodiac']}）"
+                    result_str = f"❌ 未中（{actual_label}）"
                 
-                message += f"{record['expect']}  预测:{emoji1}{z1}{emoji2}{z2}  {result_str}\n"
+                parts.append(f"{record['expect']}  预测:{label1}{label2}  {result_str}\n")
             
-            message += "\n➖➖➖➖➖➖➖"
+            parts.append("\n➖➖➖➖➖➖➖")
+            message = "".join(parts)
         
         keyboard = [
             [InlineKeyboardButton("🔮 开始预测", callback_data="ai_zodiac_predict")],
@@ -2814,58 +3417,50 @@ class LotteryBot:
 选择分析类型：
 """
         
-        keyboard = [
-            [
-                InlineKeyboardButton("📊 频率分析", callback_data="analysis_frequency"),
-                InlineKeyboardButton("🐲 生肖分布", callback_data="analysis_zodiac"),
-            ],
-            [
-                InlineKeyboardButton("⏱ 遗漏分析", callback_data="analysis_missing"),
-                InlineKeyboardButton("🌡 冷热分析", callback_data="analysis_hotcold"),
-            ],
-            [
-                InlineKeyboardButton("📈 走势分析", callback_data="analysis_trends"),
-                InlineKeyboardButton("📋 综合报告", callback_data="analysis_comprehensive"),
-            ],
-            [InlineKeyboardButton("🔙 返回主菜单", callback_data="back_to_main")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        await query.edit_message_text(message, reply_markup=ANALYSIS_MENU_MARKUP, parse_mode='HTML')
     
     async def show_frequency_analysis(self, query):
         """Show frequency analysis"""
-        history = self.db.get_history(50)
-        
-        if not history:
+        message = await self._cached_analysis('frequency', 50, self._render_frequency_analysis)
+        if message is None:
             await query.edit_message_text("暂无历史数据")
             return
         
+        await query.edit_message_text(message, reply_markup=BACK_TO_ANALYSIS_MARKUP, parse_mode='HTML')
+    
+    def _render_frequency_analysis(self) -> Optional[str]:
+        """Render the frequency analysis message (None without history)"""
+        history = self.db.get_history(50)
+        if not history:
+            return None
+        
         tema_list = [h['tema'] for h in history]
-        counter = Counter(tema_list)
-        most_common = counter.most_common(10)
+        if predictor_kernels.NUMPY_AVAILABLE:
+            most_common = predictor_kernels.most_common(tema_list, 10)
+        else:
+            most_common = Counter(tema_list).most_common(10)
+        total = len(tema_list)
         
-        message = "📊 <b>频率分析（最近50期）</b>\n\n"
-        message += "<b>Top 10 高频号码：</b>\n\n"
+        parts = ["📊 <b>频率分析（最近50期）</b>\n\n", "<b>Top 10 高频号码：</b>\n\n"]
         
         for idx, (num, count) in enumerate(most_common, 1):
-            zodiac = NUMBER_TO_ZODIAC.get(num, '未知')
-            zodiac_emoji = ZODIAC_EMOJI.get(zodiac, '')
-            percentage = (count / len(tema_list)) * 100
-            bar = "█" * int(percentage * 2)
-            message += f"{idx}. <b>{str(int(num)).zfill(2)}</b> {zodiac_emoji}{zodiac} - {count}次 ({percentage:.1f}%)\n"
-            message += f"   {bar}\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 返回分析菜单", callback_data="menu_analysis")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+            label = NUMBER_TO_LABEL.get(num, '未知')
+            percentage = (count / total) * 100
+            bar = BARS[min(int(percentage * 2), 200)]
+            parts.append(f"{idx}. <b>{TWO_DIGIT[int(num)]}</b> {label} - {count}次 ({percentage:.1f}%)\n")
+            parts.append(f"   {bar}\n")
+        return "".join(parts)
     
     async def show_zodiac_analysis(self, query):
         """Show zodiac distribution"""
+        message = await self._cached_analysis('zodiac_dist', 50, self._render_zodiac_analysis)
+        await query.edit_message_text(message, reply_markup=BACK_TO_ANALYSIS_MARKUP, parse_mode='HTML')
+    
+    def _render_zodiac_analysis(self) -> str:
+        """Render the zodiac distribution message"""
         distribution = self.predictor.get_zodiac_distribution(50)
         
-        message = "🐲 <b>生肖分布（最近50期）</b>\n\n"
+        parts = ["🐲 <b>生肖分布（最近50期）</b>\n\n"]
         
         # Sort by count
         sorted_zodiac = sorted(distribution.items(), key=lambda x: x[1]['count'], reverse=True)
@@ -2874,63 +3469,57 @@ class LotteryBot:
             count = data['count']
             percentage = data['percentage']
             zodiac_emoji = ZODIAC_EMOJI.get(zodiac, '')
-            bar = "█" * int(percentage / 2)
-            message += f"{zodiac_emoji}<b>{zodiac}</b> - {count}次 ({percentage:.1f}%)\n"
-            message += f"{bar}\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 返回分析菜单", callback_data="menu_analysis")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+            bar = BARS[min(int(percentage / 2), 200)]
+            parts.append(f"{zodiac_emoji}<b>{zodiac}</b> - {count}次 ({percentage:.1f}%)\n")
+            parts.append(f"{bar}\n")
+        return "".join(parts)
     
     async def show_missing_analysis(self, query):
         """Show missing numbers analysis"""
+        message = await self._cached_analysis('missing', 50, self._render_missing_analysis)
+        await query.edit_message_text(message, reply_markup=BACK_TO_ANALYSIS_MARKUP, parse_mode='HTML')
+    
+    def _render_missing_analysis(self) -> str:
+        """Render the missing numbers message"""
         analysis = self.predictor.get_missing_analysis()
         missing = analysis['missing']
         
-        message = "⏱ <b>遗漏分析（最近50期）</b>\n\n"
-        message += "<b>Top 15 遗漏号码：</b>\n\n"
+        parts = ["⏱ <b>遗漏分析（最近50期）</b>\n\n", "<b>Top 15 遗漏号码：</b>\n\n"]
         
         for idx, (num, periods) in enumerate(missing, 1):
-            zodiac = NUMBER_TO_ZODIAC.get(num, '未知')
-            zodiac_emoji = ZODIAC_EMOJI.get(zodiac, '')
+            label = NUMBER_TO_LABEL.get(num, '未知')
             if periods >= 50:
                 status = "未出现"
             else:
                 status = f"{periods}期"
-            message += f"{idx}. <b>{str(int(num)).zfill(2)}</b> {zodiac_emoji}{zodiac} - {status}\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 返回分析菜单", callback_data="menu_analysis")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+            parts.append(f"{idx}. <b>{TWO_DIGIT[int(num)]}</b> {label} - {status}\n")
+        return "".join(parts)
     
     async def show_hotcold_analysis(self, query):
         """Show hot and cold numbers"""
+        message = await self._cached_analysis('hot_cold', 30, self._render_hotcold_analysis)
+        await query.edit_message_text(message, reply_markup=BACK_TO_ANALYSIS_MARKUP, parse_mode='HTML')
+    
+    def _render_hotcold_analysis(self) -> str:
+        """Render the hot and cold numbers message"""
         analysis = self.predictor.get_hot_cold_analysis(30)
         
-        message = f"🌡 <b>冷热分析（最近{analysis['period']}期）</b>\n\n"
+        parts = [f"🌡 <b>冷热分析（最近{analysis['period']}期）</b>\n\n"]
         
-        message += "🔥 <b>热号 Top 10：</b>\n"
+        parts.append("🔥 <b>热号 Top 10：</b>\n")
         for idx, (num, count) in enumerate(analysis['hot'], 1):
-            zodiac = NUMBER_TO_ZODIAC.get(num, '未知')
-            zodiac_emoji = ZODIAC_EMOJI.get(zodiac, '')
-            message += f"{idx}. <b>{str(int(num)).zfill(2)}</b> {zodiac_emoji}{zodiac} - {count}次\n"
+            label = NUMBER_TO_LABEL.get(num, '未知')
+            parts.append(f"{idx}. <b>{TWO_DIGIT[int(num)]}</b> {label} - {count}次\n")
         
-        message += "\n❄️ <b>冷号 Top 10：</b>\n"
+        parts.append("\n❄️ <b>冷号 Top 10：</b>\n")
         for idx, (num, count) in enumerate(analysis['cold'], 1):
-            zodiac = NUMBER_TO_ZODIAC.get(num, '未知')
-            zodiac_emoji = ZODIAC_EMOJI.get(zodiac, '')
-            message += f"{idx}. <b>{str(int(num)).zfill(2)}</b> {zodiac_emoji}{zodiac} - {count}次\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 返回分析菜单", callback_data="menu_analysis")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+            label = NUMBER_TO_LABEL.get(num, '未知')
+            parts.append(f"{idx}. <b>{TWO_DIGIT[int(num)]}</b> {label} - {count}次\n")
+        return "".join(parts)
     
     async def show_trends_analysis(self, query):
         """Show trend analysis"""
-        history = self.db.get_history(30)
+        history = await self.db.aget_history(30)
         
         if not history:
             await query.edit_message_text("暂无历史数据")
@@ -2955,20 +3544,19 @@ class LotteryBot:
         zodiac_counter = Counter(zodiac_list)
         top_zodiacs = zodiac_counter.most_common(3)
         
-        message = f"""
+        parts = [f"""
 📈 <b>走势分析（最近30期）</b>
 
 ➖➖➖➖➖➖➖
 🔍 <b>最近10期特码走势</b>
 
-"""
+"""]
         
         for i, tema in enumerate(recent_temas, 1):
-            zodiac = NUMBER_TO_ZODIAC.get(tema, '未知')
-            emoji = ZODIAC_EMOJI.get(zodiac, '')
-            message += f"{i}. <b>{str(int(tema)).zfill(2)}</b> {emoji}{zodiac}\n"
+            label = NUMBER_TO_LABEL.get(tema, '未知')
+            parts.append(f"{i}. <b>{TWO_DIGIT[int(tema)]}</b> {label}\n")
         
-        message += f"""
+        parts.append(f"""
 
 ➖➖➖➖➖➖➖
 📊 <b>走势特征分析</b>
@@ -2979,38 +3567,35 @@ class LotteryBot:
 ➖➖➖➖➖➖➖
 🐉 <b>生肖热度排行（30期）</b>
 
-"""
+""")
         
         for idx, (zodiac, count) in enumerate(top_zodiacs, 1):
-            emoji = ZODIAC_EMOJI.get(zodiac, '')
+            label = ZODIAC_LABEL.get(zodiac, zodiac)
             percentage = count / len(zodiac_list) * 100
-            message += f"{idx}. {emoji}{zodiac}：{count}次 ({percentage:.1f}%)\n"
+            parts.append(f"{idx}. {label}：{count}次 ({percentage:.1f}%)\n")
         
-        message += """
+        parts.append("""
 
 ➖➖➖➖➖➖➖
 💡 <b>趋势提示</b>
 
-"""
+""")
         
         if consecutive_pairs >= 3:
-            message += "• 连号趋势明显，可关注连号组合\n"
+            parts.append("• 连号趋势明显，可关注连号组合\n")
         elif consecutive_pairs == 0:
-            message += "• 近期无连号，下期可能出现\n"
+            parts.append("• 近期无连号，下期可能出现\n")
         
         if len(top_zodiacs) > 0:
             hot_zodiac = top_zodiacs[0][0]
-            hot_emoji = ZODIAC_EMOJI.get(hot_zodiac, '')
-            message += f"• {hot_emoji}{hot_zodiac}生肖近期热度高\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 返回分析菜单", callback_data="menu_analysis")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+            parts.append(f"• {ZODIAC_LABEL.get(hot_zodiac, hot_zodiac)}生肖近期热度高\n")
         
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        message = "".join(parts)
+        await query.edit_message_text(message, reply_markup=BACK_TO_ANALYSIS_MARKUP, parse_mode='HTML')
     
     async def show_comprehensive_report(self, query):
         """Show comprehensive data report"""
-        history = self.db.get_history(100)
+        history = await self.db.aget_history(100)
         
         if not history:
             await query.edit_message_text("暂无历史数据")
@@ -3051,7 +3636,7 @@ class LotteryBot:
         latest = history[0]
         oldest = history[-1]
         
-        message = f"""
+        parts = [f"""
 📋 <b>综合数据报告</b>
 
 ➖➖➖➖➖➖➖
@@ -3072,22 +3657,22 @@ class LotteryBot:
 ➖➖➖➖➖➖➖
 🐉 <b>生肖分布</b>
 
-• 最热生肖：{ZODIAC_EMOJI.get(most_common_zodiac[0], '')}{most_common_zodiac[0]} ({most_common_zodiac[1]}次, {most_common_zodiac[1]/total_periods*100:.1f}%)
-• 最冷生肖：{ZODIAC_EMOJI.get(least_common_zodiac[0], '')}{least_common_zodiac[0]} ({least_common_zodiac[1]}次, {least_common_zodiac[1]/total_periods*100:.1f}%)
+• 最热生肖：{ZODIAC_LABEL.get(most_common_zodiac[0], most_common_zodiac[0])} ({most_common_zodiac[1]}次, {most_common_zodiac[1]/total_periods*100:.1f}%)
+• 最冷生肖：{ZODIAC_LABEL.get(least_common_zodiac[0], least_common_zodiac[0])} ({least_common_zodiac[1]}次, {least_common_zodiac[1]/total_periods*100:.1f}%)
 • 理论期望：{total_periods/12:.2f}次/生肖
 
 ➖➖➖➖➖➖➖
 📈 <b>遗漏分析</b>
 
 • 从未出现：{len(not_appeared)}个号码
-"""
+"""]
         
         if not_appeared:
-            not_appeared_list = sorted(list(not_appeared))[:5]
-            not_appeared_str = ', '.join([f"{str(int(n)).zfill(2)}" for n in not_appeared_list])
-            message += f"• 示例：{not_appeared_str}\n"
+            not_appeared_list = heapq.nsmallest(5, not_appeared)
+            not_appeared_str = ', '.join([TWO_DIGIT[int(n)] for n in not_appeared_list])
+            parts.append(f"• 示例：{not_appeared_str}\n")
         
-        message += f"""
+        parts.append(f"""
 
 ➖➖➖➖➖➖➖
 📊 <b>区间分布</b>
@@ -3101,148 +3686,99 @@ class LotteryBot:
 ➖➖➖➖➖➖➖
 💡 <b>综合分析结论</b>
 
-"""
+""")
         
         # Analysis conclusions
         if most_common_tema[1] > total_periods/49 * 2:
-            message += f"• 热号策略：关注 {most_common_tema[0]:02d}（异常热）\n"
+            parts.append(f"• 热号策略：关注 {most_common_tema[0]:02d}（异常热）\n")
         
         if len(not_appeared) > 10:
-            message += f"• 回补策略：{len(not_appeared)}个号码从未出现\n"
+            parts.append(f"• 回补策略：{len(not_appeared)}个号码从未出现\n")
         
         if most_common_zodiac[1] > total_periods/12 * 1.5:
-            emoji = ZODIAC_EMOJI.get(most_common_zodiac[0], '')
-            message += f"• 生肖策略：{emoji}{most_common_zodiac[0]}热度高\n"
+            parts.append(f"• 生肖策略：{ZODIAC_LABEL.get(most_common_zodiac[0], most_common_zodiac[0])}热度高\n")
         
         if least_common_zodiac[1] < total_periods/12 * 0.5:
-            emoji = ZODIAC_EMOJI.get(least_common_zodiac[0], '')
-            message += f"• 冷肖回补：{emoji}{least_common_zodiac[0]}严重遗漏\n"
+            parts.append(f"• 冷肖回补：{ZODIAC_LABEL.get(least_common_zodiac[0], least_common_zodiac[0])}严重遗漏\n")
         
-        keyboard = [[InlineKeyboardButton("🔙 返回分析菜单", callback_data="menu_analysis")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        message = "".join(parts)
+        await query.edit_message_text(message, reply_markup=BACK_TO_ANALYSIS_MARKUP, parse_mode='HTML')
     
     async def show_history_menu(self, query):
         """Show history menu"""
-        message = """
-📜 <b>历史记录菜单</b>
-
-查询历史开奖结果：
-
-选择查询范围：
-"""
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("最近10期", callback_data="history_10"),
-                InlineKeyboardButton("最近20期", callback_data="history_20"),
-            ],
-            [
-                InlineKeyboardButton("最近30期", callback_data="history_30"),
-                InlineKeyboardButton("最近50期", callback_data="history_50"),
-            ],
-            [InlineKeyboardButton("🔙 返回主菜单", callback_data="back_to_main")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        await query.edit_message_text(HISTORY_MENU_TEXT, reply_markup=HISTORY_MENU_MARKUP, parse_mode='HTML')
+    
+    async def _get_history_rows(self) -> Tuple[Tuple[str, ...], int]:
+        """Pre-rendered rows of the latest 10 draws and the total number of stored draws"""
+        version = self.db.version
+        if self._history_rows is None or self._history_rows[0] != version:
+            history, count = await asyncio.gather(self.db.aget_history(10), self.db.acount_history())
+            rows = []
+            for h in history:  # Show max 10 in one message
+                codes = ' '.join([TWO_DIGIT[int(x)] for x in h['open_code'][:6]])
+                zodiac_label = ZODIAC_LABEL.get(h['tema_zodiac'], h['tema_zodiac'])
+                rows.append(
+                    f"<b>期号：</b>{h['expect']}\n"
+                    f"<b>号码：</b><code>{codes}</code>\n"
+                    f"<b>特码：</b><code>{TWO_DIGIT[h['tema']]}</code> {zodiac_label}\n"
+                    f"<b>时间：</b>{h['open_time']}\n"
+                    + HISTORY_SEP
+                )
+            self._history_rows = (version, tuple(rows), count)
+        return self._history_rows[1], self._history_rows[2]
     
     async def show_history(self, query, limit: int):
         """Show lottery history"""
-        history = self.db.get_history(limit)
+        rows, available = await self._get_history_rows()
+        total = min(limit, available)
         
-        if not history:
+        if not total:
             await query.edit_message_text("暂无历史数据")
             return
         
-        message = f"📜 <b>历史记录（最近{limit}期）</b>\n\n"
+        parts = [f"📜 <b>历史记录（最近{limit}期）</b>\n\n"]
+        parts.extend(rows[:total])
         
-        for h in history[:10]:  # Show max 10 in one message
-            codes = ' '.join([f"{str(int(x)).zfill(2)}" for x in h['open_code'][:6]])
-            zodiac_emoji = ZODIAC_EMOJI.get(h['tema_zodiac'], '')
-            message += f"<b>期号：</b>{h['expect']}\n"
-            message += f"<b>号码：</b><code>{codes}</code>\n"
-            message += f"<b>特码：</b><code>{h['tema']:02d}</code> {zodiac_emoji}{h['tema_zodiac']}\n"
-            message += f"<b>时间：</b>{h['open_time']}\n"
-            message += "─" * 30 + "\n"
+        if total > 10:
+            parts.append(f"\n<i>仅显示前10期，共{total}期</i>")
+        message = "".join(parts)
         
-        if len(history) > 10:
-            message += f"\n<i>仅显示前10期，共{len(history)}期</i>"
-        
-        keyboard = [[InlineKeyboardButton("🔙 返回历史菜单", callback_data="menu_history")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        await query.edit_message_text(message, reply_markup=BACK_TO_HISTORY_MARKUP, parse_mode='HTML')
     
-    async def show_settings_menu(self, query):
-        """Show settings menu"""
-        user_id = query.from_user.id
-        settings = self.db.get_user_settings(user_id)
-        
-        notify_status = "✅ 已开启" if settings['notify_enabled'] else "❌ 已关闭"
-        reminder_status = "✅ 已开启" if settings['reminder_enabled'] else "❌ 已关闭"
-        auto_predict_status = "✅ 已开启" if settings['auto_predict'] else "❌ 已关闭"
-        
-        message = f"""
-⚙️ <b>个人设置</b>
-
-当前设置状态：
-
-🔔 <b>开奖通知：</b>{notify_status}
-⏰ <b>开奖提醒：</b>{reminder_status}
-🤖 <b>自动预测：</b>{auto_predict_status}
-
-点击下方按钮切换设置：
-"""
+    async def show_settings_menu(self, query, settings: Optional[Dict] = None):
+        """Show settings menu (settings: already-loaded settings row, skips the lookup)"""
+        if settings is None:
+            settings = await self.db.aget_user_settings(query.from_user.id)
         
-        keyboard = [
-            [InlineKeyboardButton(
-                f"🔔 开奖通知 {notify_status}",
-                callback_data="setting_notify"
-            )],
-            [InlineKeyboardButton(
-                f"⏰ 开奖提醒 (21:00) {reminder_status}",
-                callback_data="setting_reminder"
-            )],
-            [InlineKeyboardButton(
-                f"🤖 自动预测 {auto_predict_status}",
-                callback_data="setting_auto_predict"
-            )],
-            [InlineKeyboardButton("🔙 返回主菜单", callback_data="back_to_main")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message, reply_markup = SETTINGS_MENUS[(
+            bool(settings['notify_enabled']),
+            bool(settings['reminder_enabled']),
+            bool(settings['auto_predict'])
+        )]
         
         await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
     
     async def toggle_setting(self, query, data: str):
         """Toggle user setting"""
         user_id = query.from_user.id
-        setting_map = {
-            'setting_notify': 'notify_enabled',
-            'setting_reminder': 'reminder_enabled',
-            'setting_auto_predict': 'auto_predict'
-        }
-        
-        setting = setting_map.get(data)
+        setting = SETTING_CALLBACKS.get(data)
+        settings = None
         if setting:
-            current = self.db.get_user_settings(user_id)
-            new_value = 0 if current[setting] else 1
-            self.db.update_user_setting(user_id, setting, new_value)
+            settings = await self.db.atoggle_user_setting(user_id, setting)
         
         # Refresh settings menu
-        await self.show_settings_menu(query)
+        await self.show_settings_menu(query, settings)
     
     async def show_latest_result(self, query):
         """Show latest lottery result"""
-        result = self.db.get_latest_result()
+        result = await self.db.aget_latest_result()
         
         if not result:
             await query.edit_message_text("暂无开奖数据")
             return
         
-        codes = ' '.join([f"{str(int(x)).zfill(2)}" for x in result['open_code'][:6]])
-        zodiac_emoji = ZODIAC_EMOJI.get(result['tema_zodiac'], '')
+        codes = ' '.join([TWO_DIGIT[int(x)] for x in result['open_code'][:6]])
+        zodiac_label = ZODIAC_LABEL.get(result['tema_zodiac'], result['tema_zodiac'])
         
         message = f"""
 📊 <b>最新开奖结果</b>
@@ -3251,9 +3787,9 @@ class LotteryBot:
 <b>开奖时间：</b>{result['open_time']}
 
 <b>号码：</b><code>{codes}</code>
-<b>特码：</b><code>{result['tema']:02d}</code> 🎯
+<b>特码：</b><code>{TWO_DIGIT[result['tema']]}</code> 🎯
 
-<b>生肖：</b>{zodiac_emoji}{result['tema_zodiac']}
+<b>生肖：</b>{zodiac_label}
 
 ─────────────────
 """
@@ -3271,97 +3807,26 @@ class LotteryBot:
     
     async def show_help(self, query):
         """Show help message"""
-        message = """
-❓ <b>帮助信息</b>
-
-<b>📌 功能说明：</b>
-
-<b>🎯 智能预测</b>
-• AI综合预测：多因素分析
-• 生肖预测：基于生肖周期
-• 冷热号预测：统计分析
-
-<b>📊 最新开奖</b>
-• 查看最新期开奖结果
-• 显示特码和生肖
-
-<b>📈 数据分析</b>
-• 频率分析：号码出现统计
-• 生肖分布：生肖比例分析
-• 遗漏分析：未出号码追踪
-• 冷热分析：冷热号对比
-
-<b>📜 历史记录</b>
-• 查询历史开奖数据
-• 支持多种查询范围
-
-<b>⚙️ 个人设置</b>
-• 开奖通知：自动推送结果
-• 开奖提醒：21:00提醒
-• 自动预测：开奖后自动预测
-
-<b>⏰ 开奖时间：</b>
-每晚 21:32:32 (北京时间)
-
-<b>⚠️ 注意事项：</b>
-• 预测仅供参考
-• 请理性对待
-• 谨慎决策
-
-如有问题，请联系管理员。
-"""
-        
-        keyboard = [[InlineKeyboardButton("🔙 返回主菜单", callback_data="back_to_main")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        await query.edit_message_text(HELP_TEXT, reply_markup=BACK_TO_MAIN_MARKUP, parse_mode='HTML')
     
     async def back_to_main(self, query):
         """Back to main menu"""
-        user = query.from_user
-        countdown = self.get_countdown()
-        
-        message = f"""
-🎰 <b>预测机器人</b> 🎰
-
-👋 欢迎，{user.first_name}！
-
-📅 今日开奖倒计时：<code>{countdown}</code>
-⏰ 开奖时间：每晚 {LOTTERY_TIME}
-
-⚠️ <b>免责声明</b>
-本机器人仅供娱乐和学习参考，预测结果不构成任何投资建议。请理性娱乐，谨慎决策。
-
-请选择功能：
-"""
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("🎯 智能预测", callback_data="menu_predict"),
-                InlineKeyboardButton("📊 最新开奖", callback_data="latest_result"),
-            ],
-            [
-                InlineKeyboardButton("📈 数据分析", callback_data="menu_analysis"),
-                InlineKeyboardButton("📜 历史记录", callback_data="menu_history"),
-            ],
-            [
-                InlineKeyboardButton("🔮 玄机预测图", callback_data="xuanji_menu"),
-            ],
-            
-            
-            [
-                InlineKeyboardButton("⚙️ 个人设置", callback_data="menu_settings"),
-                InlineKeyboardButton("❓ 帮助", callback_data="help"),
-            ],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message = MAIN_MENU_TEMPLATE.format(first_name=query.from_user.first_name, countdown=self.get_countdown())
         
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        await query.edit_message_text(message, reply_markup=MAIN_MENU_MARKUP, parse_mode='HTML')
     
     async def check_new_result(self, context):
-        """Check for new lottery result"""
+        """Check for new lottery result, skipping if a check is already running"""
+        # 多个检测任务可能重叠（接口慢时），只允许一个在跑，避免重复入库和重复通知
+        if self._check_lock.locked():
+            return
+        async with self._check_lock:
+            await self._check_new_result(context)
+    
+    async def _check_new_result(self, context):
+        """Fetch the latest result and store/notify it if it is new"""
         try:
-            result = self.api.get_latest_result()
+            result = await self.api.aget_latest_result()
             
             if not result:
                 logger.warning("No result from API")
@@ -3374,7 +3839,7 @@ class LotteryBot:
                 return
             
             # Check if already in database
-            existing = self.db.get_latest_result()
+            existing = await self.db.aget_latest_result()
             if existing and existing['expect'] == expect:
                 self.last_expect = expect
                 return
@@ -3383,7 +3848,7 @@ class LotteryBot:
             logger.info(f"New result found: {expect}")
             
             # Save to database
-            self.db.save_lottery_result(
+            await self.db.asave_lottery_result(
                 expect,
                 result['open_code'],
                 result['tema'],
@@ -3392,16 +3857,19 @@ class LotteryBot:
             )
             
             self.last_expect = expect
+            self._analysis_cache.clear()
             
 
             # Update prediction result if exists
-            self.db.update_prediction_result(expect, result['tema'], result['tema_zodiac'])
+            await self.db.aupdate_prediction_result(expect, result['tema'], result['tema_zodiac'])
             
             # Check 3in3 predictions
-            self.db.check_3in3_results(expect)
+            await self.db.acheck_3in3_results(expect)
             
-            # Notify all users with notifications enabled
-            await self.notify_users(result, context)
+            # Notify with this period's prediction comparison
+            prediction = await self.db.aget_prediction_record(expect)
+            # 群发放到后台，检测任务不必等所有接收者发送完毕
+            self._spawn(self.notify_users(result, prediction, context))
             
         except Exception as e:
             import traceback
@@ -3462,7 +3930,7 @@ class LotteryBot:
                              fill=color, outline=(0, 0, 0), width=2)
                 
                 # Draw number
-                num_text = f"{str(int(num)).zfill(2)}"
+                num_text = TWO_DIGIT[int(num)]
                 bbox = draw.textbbox((0, 0), num_text, font=number_font)
                 text_width = bbox[2] - bbox[0]
                 text_height = bbox[3] - bbox[1]
@@ -3490,7 +3958,7 @@ class LotteryBot:
                          fill=colors['green'], outline=(0, 0, 0), width=2)
             
             # Draw tema number
-            tema_text = f"{str(int(tema)).zfill(2)}"
+            tema_text = TWO_DIGIT[int(tema)]
             bbox = draw.textbbox((0, 0), tema_text, font=number_font)
             text_width = bbox[2] - bbox[0]
             text_height = bbox[3] - bbox[1]
@@ -3515,77 +3983,55 @@ class LotteryBot:
             logger.error(f"Error generating image: {e}")
             return None 
 
-    async def notify_users(self, result: Dict, context: ContextTypes.DEFAULT_TYPE):
-        """Notify users about new result with prediction comparison"""
+    async def notify_users(self, result: Dict, prediction: Optional[Dict],
+                           context: ContextTypes.DEFAULT_TYPE):
+        """Notify users about new result with prediction comparison
+        
+        prediction is this period's prediction record (None if there was
+        none), fetched by the caller.
+        """
         logger.info(f"[DEBUG] notify_users called")
         logger.info(f"[DEBUG] result type: {type(result).__name__}")
         logger.info(f"[DEBUG] result content: {result}")
-        users = self.db.get_all_notify_users()
         
-        codes = ' '.join([f"{str(int(x)).zfill(2)}" for x in result['open_code'][:6]])
-        zodiac_emoji = ZODIAC_EMOJI.get(result['tema_zodiac'], '')
-        
-        # Check if there's a prediction for this period
-        prediction = self.db.get_prediction_record(result['expect'])
-        
-        message = f"""
-🎰 <b>【新开奖结果】</b>
-
-➖➖➖➖➖➖➖
-📅 期号：{result['expect']}
-⏰ 时间：{result['open_time']}
-
-🎲 正码：<code>{codes}</code>
-
-➖➖➖➖➖➖➖
-🌟 <b>特码：{result['tema']:02d}</b>  {zodiac_emoji}{result['tema_zodiac']}
-➖➖➖➖➖➖➖
-"""
+        ns = {
+            'expect': result['expect'],
+            'open_time': result['open_time'],
+            'codes': ' '.join([TWO_DIGIT[int(x)] for x in result['open_code'][:6]]),
+            'tema': result['tema'],
+            'tema_label': ZODIAC_LABEL.get(result['tema_zodiac'], result['tema_zodiac']),
+        }
+        parts = [NOTIFY_RESULT_TEMPLATE.format_map(ns)]
         
         # Add prediction comparison if exists and result has been recorded
         # is_hit > 0 means result has been compared (1=hit, 2=miss)
         if prediction and prediction.get('is_hit', 0) > 0:
             pred_z1 = prediction['predict_zodiac1']
             pred_z2 = prediction['predict_zodiac2']
-            emoji1 = ZODIAC_EMOJI.get(pred_z1, '')
-            emoji2 = ZODIAC_EMOJI.get(pred_z2, '')
-            
-            message += f"""
-
-🔮 <b>AI 预测对比</b>
-
-预测：{emoji1}{pred_z1} + {emoji2}{pred_z2}
-结果：{zodiac_emoji}{result['tema_zodiac']}
-
-"""
+            ns['label1'] = ZODIAC_LABEL.get(pred_z1, pred_z1)
+            ns['label2'] = ZODIAC_LABEL.get(pred_z2, pred_z2)
+            parts.append(NOTIFY_PREDICTION_TEMPLATE.format_map(ns))
             
             if prediction['is_hit'] == 1:
-                if prediction['hit_rank'] == 1:
-                    message += f"🎉 <b>预测命中！TOP1 生肖正确！</b>\n"
-                else:
-                    message += f"🎊 <b>预测命中！TOP2 生肖正确！</b>\n"
+                parts.append(NOTIFY_HIT_TOP1 if prediction['hit_rank'] == 1 else NOTIFY_HIT_TOP2)
                 
                 # Get hit rate stats
-                hit_stats = self.db.calculate_hit_rate()
-                message += f"""
-
-➖➖➖➖➖➖➖
-📊 <b>命中率统计</b>
-
-总命中率：{hit_stats['hit_rate']:.1f}%
-"""
+                hit_stats = await self.db.acalculate_hit_rate()
+                parts.append(NOTIFY_STATS_TEMPLATE.format_map(hit_stats))
                 if hit_stats['recent_10_total'] > 0:
-                    message += f"近10期：{hit_stats['recent_10_hits']}/{hit_stats['recent_10_total']} = {hit_stats['recent_10_rate']:.1f}%\n"
+                    parts.append(NOTIFY_RECENT10_TEMPLATE.format_map(hit_stats))
             elif prediction['is_hit'] == 2:
                 # is_hit == 2 means it's a miss
-                message += f"💔 <b>很遗憾，本期预测未中</b>\n"
+                parts.append(NOTIFY_MISS)
             
-            message += "\n➖➖➖➖➖➖➖\n"
+            parts.append("\n➖➖➖➖➖➖➖\n")
         
-        message += "\n恭喜中奖的朋友！ 🎊"
+        parts.append("\n恭喜中奖的朋友！ 🎊")
+        message = "".join(parts)
         
         keyboard = [[InlineKeyboardButton("🎯 预测下期", callback_data="ai_zodiac_predict")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # 消息与键盘只构建一次，所有接收者共用
+        send_kwargs = dict(text=message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
         
         # Generate result image using tupian module
         img_gen = ResultImageGenerator()
@@ -3597,33 +4043,91 @@ class LotteryBot:
             logger.warning("ADMIN_USER_IDS not configured")
             return
         
-        for user_id in [admin_id]:
+        # 图片只读一次，各用户共用同一份字节
+        photo = None
+        if image_path and os.path.exists(image_path):
+            with open(image_path, 'rb') as f:
+                photo = f.read()
+        
+        # 已收到图片的用户，RetryAfter 重试时只补发文字
+        photo_sent = set()
+        
+        async def send_one(user_id: int):
             try:
                 # Send image first
-                if image_path and os.path.exists(image_path):
-                    await context.bot.send_photo(
-                        chat_id=user_id,
-                        photo=open(image_path, 'rb')
-                    )
+                if photo and user_id not in photo_sent:
+                    await context.bot.send_photo(chat_id=user_id, photo=photo)
+                    photo_sent.add(user_id)
                 
                 # Then send text message
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=message,
-                    reply_markup=reply_markup,
-                    parse_mode='HTML'
-                )
+                await context.bot.send_message(chat_id=user_id, **send_kwargs)
                 logger.info(f"Notified user {user_id}")
+            except (Forbidden, RetryAfter):
+                raise
             except Exception as e:
                 logger.error(f"Error notifying user {user_id}: {e}")
         
+        await self._broadcast([admin_id], send_one)
+        
         # Clean up image file
         if image_path and os.path.exists(image_path):
             os.remove(image_path)
     
+    def _spawn(self, coro):
+        """Run coro as a background task, keeping a reference and logging its failure"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+    
+    def _background_done(self, task: asyncio.Task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background task failed: {task.exception()}")
+    
+    async def _broadcast(self, user_ids: List[int], send_one, chunk_size: int = 25):
+        """Run send_one for every user, concurrently within each chunk
+        
+        Chunks are spaced one second apart to stay under Telegram's
+        global limit of 30 messages per second. Sends rejected with
+        RetryAfter are retried once after the requested delay by calling
+        send_one again, so send_one must skip any step that already went
+        through. Users who have blocked the bot get their notifications
+        switched off in one update; admins are left alone since they are
+        sent to regardless of their settings.
+        """
+        blocked = []
+        for start in range(0, len(user_ids), chunk_size):
+            if start:
+                await asyncio.sleep(1)
+            chunk = user_ids[start:start + chunk_size]
+            results = await asyncio.gather(*(send_one(user_id) for user_id in chunk), return_exceptions=True)
+            
+            limited = [i for i, outcome in enumerate(results) if isinstance(outcome, RetryAfter)]
+            if limited:
+                delay = max(results[i].retry_after for i in limited)
+                logger.warning(f"Rate limited, retrying {len(limited)} sends in {delay}s")
+                await asyncio.sleep(delay)
+                retried = await asyncio.gather(*(send_one(chunk[i]) for i in limited), return_exceptions=True)
+                for i, outcome in zip(limited, retried):
+                    results[i] = outcome
+            
+            for user_id, outcome in zip(chunk, results):
+                if isinstance(outcome, Forbidden):
+                    if user_id in ADMIN_USER_IDS:
+                        logger.warning(f"Admin {user_id} has blocked the bot")
+                    else:
+                        blocked.append(user_id)
+                elif isinstance(outcome, Exception):
+                    logger.error(f"Error sending to user {user_id}: {outcome}")
+        
+        if blocked:
+            logger.info(f"Disabling notifications for {len(blocked)} users who blocked the bot")
+            await self.db.adisable_notifications(blocked)
+    
     async def send_reminder(self, context: ContextTypes.DEFAULT_TYPE):
         """Send reminder before lottery"""
-        users = self.db.get_all_reminder_users()
+        users = await self.db.aget_all_reminder_users()
         
         countdown = self.get_countdown()
         
@@ -3638,7 +4142,7 @@ class LotteryBot:
 """
         
         keyboard = [[InlineKeyboardButton("🎯 立即预测", callback_data="menu_predict")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        send_kwargs = dict(text=message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
         
         # Only notify admin
         admin_id = int(os.getenv('ADMIN_USER_IDS', '0'))
@@ -3646,31 +4150,37 @@ class LotteryBot:
             logger.warning("ADMIN_USER_IDS not configured")
             return
         
-        for user_id in [admin_id]:
+        async def send_one(user_id: int):
             try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=message,
-                    reply_markup=reply_markup,
-                    parse_mode='HTML'
-                )
+                await context.bot.send_message(chat_id=user_id, **send_kwargs)
                 logger.info(f"Sent reminder to user {user_id}")
+            except (Forbidden, RetryAfter):
+                raise
             except Exception as e:
                 logger.error(f"Error sending reminder to user {user_id}: {e}")
+        
+        await self._broadcast([admin_id], send_one)
     
     def setup_scheduler(self, application: Application):
         """Setup scheduled jobs"""
         scheduler = AsyncIOScheduler(timezone=self.tz)
         
         # Check for new results
-        # Check for new results at 21:30-21:40 (every minute)
-        for m in range(30, 41):  # 30 到 40 分钟
+        # 开奖时间前后 3 分钟内每 CHECK_INTERVAL 秒轮询一次
+        for i, trigger in enumerate(self._draw_window_triggers(minutes=3)):
             scheduler.add_job(
-                self.smart_check,
-                CronTrigger(hour=21, minute=m, second=0, timezone=self.tz),
+                self.check_new_result,
+                trigger,
                 args=[application],
-                id=f'smart_check_{m}'
+                id=f'draw_window_check_{i}'
             )
+        # 窗口外低频对账（补漏晚到或漏掉的开奖结果）
+        scheduler.add_job(
+            self.check_new_result,
+            IntervalTrigger(minutes=15, timezone=self.tz),
+            args=[application],
+            id='reconcile_check'
+        )
         # Daily reminder at 21:00
         scheduler.add_job(
             self.send_reminder,
@@ -3684,9 +4194,24 @@ class LotteryBot:
         
         return scheduler
     
-    async def smart_check(self, application: Application):
-        """Smart check - always check for new results"""
-        await self.check_new_result(application)
+    def _draw_window_triggers(self, minutes: int = 3) -> List[CronTrigger]:
+        """Build cron triggers covering LOTTERY_TIME ± minutes"""
+        hour, minute, second = self._lottery_hms
+        draw_time = datetime(2000, 1, 1, hour, minute, second)
+        start = draw_time - timedelta(minutes=minutes)
+        end = draw_time + timedelta(minutes=minutes)
+        interval = max(1, min(CHECK_INTERVAL, 59))
+        
+        # 窗口跨整点时拆成两个触发器
+        if start.hour == end.hour:
+            spans = [(start.hour, f'{start.minute}-{end.minute}')]
+        else:
+            spans = [(start.hour, f'{start.minute}-59'), (end.hour, f'0-{end.minute}')]
+        
+        return [
+            CronTrigger(hour=h, minute=m, second=f'*/{interval}', timezone=self.tz)
+            for h, m in spans
+        ]
     
     def run(self):
         """Run the bot"""
@@ -3725,6 +4250,8 @@ class LotteryBot:
             logger.info("Bot stopped by user")
         finally:
             scheduler.shutdown()
+            self._predict_executor.shutdown(wait=True)
+            self.db.close()
 
 
 def main():
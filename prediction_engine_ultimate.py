@@ -35,6 +35,7 @@ Analysis Dimensions (100% total weight):
    - Random Perturbation
 """
 
+import heapq
 import random
 import logging
 from typing import Dict, List, Tuple
@@ -81,6 +82,9 @@ for zodiac, numbers in ZODIAC_NUMBERS.items():
     for num in numbers:
         NUMBER_TO_ZODIAC[num] = zodiac
 
+# Set form of ZODIAC_NUMBERS for O(1) membership tests
+ZODIAC_NUMBER_SETS = {zodiac: frozenset(numbers) for zodiac, numbers in ZODIAC_NUMBERS.items()}
+
 # Zodiac relationships (Liu Chong - Six Clashes)
 ZODIAC_LIU_CHONG = {
     '鼠': '马', '牛': '羊', '虎': '猴', '兔': '鸡', '龙': '狗', '蛇': '猪',
@@ -215,14 +219,8 @@ class PredictionEngineUltimate:
             )
             zodiac_scores[zodiac] = score
         
-        # Sort by total score and get top 2
-        sorted_zodiacs = sorted(
-            zodiac_scores.items(), 
-            key=lambda x: x[1]['total_score'], 
-            reverse=True
-        )
-        
-        top2 = sorted_zodiacs[:2]
+        # Get top 2 by total score
+        top2 = heapq.nlargest(2, zodiac_scores.items(), key=lambda x: x[1]['total_score'])
         zodiac1, analysis1 = top2[0]
         zodiac2, analysis2 = top2[1]
         
@@ -544,7 +542,7 @@ class PredictionEngineUltimate:
         Analyzes temperature of specific numbers in the zodiac.
         """
         tema_list = [h.get('tema', 0) for h in history[:50]]
-        zodiac_nums = ZODIAC_NUMBERS[zodiac]
+        zodiac_nums = ZODIAC_NUMBER_SETS[zodiac]
         
         # Count appearances of this zodiac's numbers
         count = sum(1 for t in tema_list if t in zodiac_nums)
@@ -0,0 +1,338 @@
+"""
+Numeric kernels for the prediction engines
+
+Hot scoring loops compiled with Numba. Every kernel works on small
+integer arrays (tema numbers 1-49, zodiac ids 0-11) instead of lists of
+history dicts, and reproduces the float arithmetic of the pure Python
+implementation it replaces so both paths rank numbers identically.
+
+NumPy and Numba are optional: when they are not installed NUMPY_AVAILABLE /
+NUMBA_AVAILABLE are False and callers keep using their pure Python code
+paths. With NumPy but no Numba the scoring runs as plain array ops.
+"""
+
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.warning("Numba not available. Prediction kernels will run without JIT compilation.")
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def comprehensive_scores(tema, zodiac_ids, num_zodiac):
+        """Four-factor comprehensive score for numbers 1-49 (index 0 unused)"""
+        scores = np.zeros(50, np.float64)
+        n = tema.shape[0]
+
+        # 因子1：长期频率分析（100期，30%）
+        freq = np.zeros(50, np.int64)
+        for i in range(min(100, n)):
+            t = tema[i]
+            if 1 <= t <= 49:
+                freq[t] += 1
+        expected_freq = 100 / 49
+        for num in range(1, 50):
+            if freq[num] == 0:
+                scores[num] += 30
+            else:
+                score = ((expected_freq - freq[num]) / expected_freq) * 30
+                if score > 0:
+                    scores[num] += score
+
+        # 因子2：短期遗漏分析（20期，35%）
+        last_seen = np.full(50, -1, np.int64)
+        for i in range(min(20, n)):
+            t = tema[i]
+            if 1 <= t <= 49 and last_seen[t] < 0:
+                last_seen[t] = i
+        for num in range(1, 50):
+            if last_seen[num] < 0:
+                scores[num] += 35
+            else:
+                scores[num] += (last_seen[num] / 20) * 35
+
+        # 因子3：生肖周期分析（30期，25%）
+        zodiac_freq = np.zeros(12, np.int64)
+        for i in range(min(30, zodiac_ids.shape[0])):
+            z = zodiac_ids[i]
+            if z >= 0:
+                zodiac_freq[z] += 1
+        expected_zodiac_freq = 30 / 12
+        for num in range(1, 50):
+            z = num_zodiac[num]
+            if z >= 0:
+                if zodiac_freq[z] == 0:
+                    scores[num] += 25
+                else:
+                    score = ((expected_zodiac_freq - zodiac_freq[z]) / expected_zodiac_freq) * 25
+                    if score > 0:
+                        scores[num] += score
+
+        # 因子4：连号避免机制（10%）
+        recent = np.zeros(50, np.int64)  # 0=未出现, 1=最近2期, 2=3-5期
+        for i in range(min(5, n) - 1, -1, -1):
+            t = tema[i]
+            if 1 <= t <= 49:
+                recent[t] = 1 if i < 2 else 2
+        for num in range(1, 50):
+            if recent[num] == 1:
+                scores[num] -= 10
+            elif recent[num] == 2:
+                scores[num] -= 5
+            else:
+                scores[num] += 10
+
+        return scores
+
+    @njit(cache=True)
+    def zodiac_factor_scores(zodiac_ids, period):
+        """Frequency/missing/cycle/trend scores for the 12 zodiacs, one row each"""
+        n = zodiac_ids.shape[0]
+        count = np.zeros(12, np.int64)
+        recent = np.zeros(12, np.int64)
+        first = np.full(12, -1, np.int64)
+        for i in range(n):
+            z = zodiac_ids[i]
+            if z >= 0:
+                count[z] += 1
+                if i < 10:
+                    recent[z] += 1
+                if first[z] < 0:
+                    first[z] = i
+
+        out = np.zeros((12, 4), np.float64)
+        expected = period / 12
+        for z in range(12):
+            c = count[z]
+            # 频率：出现越少分数越高
+            if c == 0:
+                out[z, 0] = 100.0
+            else:
+                out[z, 0] = min(100.0, max(0.0, 50.0 + (expected - c) * 5))
+            # 遗漏：未出现按整段历史计
+            missing = first[z] if first[z] >= 0 else n
+            out[z, 1] = min(100.0, missing * 2)
+            # 周期：低于理论期望加分
+            if c < expected:
+                out[z, 2] = min(100.0, (expected - c) / expected * 100)
+            else:
+                out[z, 2] = max(0.0, 50.0 - (c - expected) * 5)
+            # 趋势：最近10期
+            r = recent[z]
+            if r == 0:
+                out[z, 3] = 100.0
+            else:
+                out[z, 3] = max(0.0, 100.0 - r * 20)
+        return out
+
+    @njit(cache=True)
+    def freq_missing_kernel(tema, n_numbers):
+        """Occurrence counts and first (most recent) index per number, one pass"""
+        counts = np.zeros(n_numbers, np.int64)
+        last_seen = np.full(n_numbers, -1, np.int64)
+        for i in range(tema.shape[0]):
+            t = tema[i]
+            if 0 <= t < n_numbers:
+                counts[t] += 1
+                if last_seen[t] < 0:
+                    last_seen[t] = i
+        return counts, last_seen
+
+
+def comprehensive_scores_numpy(tema: 'np.ndarray', zodiac_ids: 'np.ndarray', num_zodiac: 'np.ndarray') -> 'np.ndarray':
+    """Array-op version of comprehensive_scores for installs without Numba"""
+    # 因子1：长期频率分析（100期，30%）
+    t100 = tema[:100]
+    freq = np.bincount(t100[(t100 >= 1) & (t100 <= 49)], minlength=50)[:50]
+    expected_freq = 100 / 49
+    f1 = np.where(freq == 0, 30.0, np.maximum(((expected_freq - freq) / expected_freq) * 30, 0))
+
+    # 因子2：短期遗漏分析（20期，35%）
+    t20 = tema[:20]
+    last_seen = np.full(50, -1, np.int64)
+    seen, first_idx = np.unique(t20, return_index=True)
+    keep = (seen >= 1) & (seen <= 49)
+    last_seen[seen[keep]] = first_idx[keep]
+    f2 = np.where(last_seen < 0, 35.0, (last_seen / 20) * 35)
+
+    # 因子3：生肖周期分析（30期，25%）
+    z30 = zodiac_ids[:30]
+    zodiac_freq = np.bincount(z30[z30 >= 0], minlength=12)
+    expected_zodiac_freq = 30 / 12
+    has_zodiac = num_zodiac >= 0
+    zf = np.where(has_zodiac, zodiac_freq[np.where(has_zodiac, num_zodiac, 0)], 0)
+    f3 = np.where(zf == 0, 25.0, np.maximum(((expected_zodiac_freq - zf) / expected_zodiac_freq) * 25, 0))
+    f3 = np.where(has_zodiac, f3, 0.0)
+
+    # 因子4：连号避免机制（10%）
+    f4 = np.full(50, 10.0)
+    t5 = tema[:5]
+    in_range = (t5 >= 1) & (t5 <= 49)
+    f4[t5[2:][in_range[2:]]] = -5.0
+    f4[t5[:2][in_range[:2]]] = -10.0
+
+    scores = ((f1 + f2) + f3) + f4
+    scores[0] = 0.0
+    return scores
+
+
+def zodiac_factor_scores_numpy(zodiac_ids: 'np.ndarray', period: int) -> 'np.ndarray':
+    """Array-op version of zodiac_factor_scores for installs without Numba"""
+    n = zodiac_ids.shape[0]
+    pos = np.flatnonzero(zodiac_ids >= 0)
+    ids = zodiac_ids[pos].astype(np.int64)
+    count = np.bincount(ids, minlength=12)[:12]
+    recent = np.bincount(ids[pos < 10], minlength=12)[:12]
+    first = np.full(12, n, np.int64)
+    seen, first_idx = np.unique(ids, return_index=True)
+    first[seen] = pos[first_idx]
+
+    out = np.zeros((12, 4), np.float64)
+    expected = period / 12
+    out[:, 0] = np.where(count == 0, 100.0, np.minimum(100.0, np.maximum(0.0, 50.0 + (expected - count) * 5)))
+    out[:, 1] = np.minimum(100.0, first * 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        below = np.minimum(100.0, (expected - count) / expected * 100)
+    out[:, 2] = np.where(count < expected, below, np.maximum(0.0, 50.0 - (count - expected) * 5))
+    out[:, 3] = np.where(recent == 0, 100.0, np.maximum(0.0, 100.0 - recent * 20))
+    return out
+
+
+def _count_keys(values: List[int]) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+    """Distinct values, their counts and a unique Counter-order sort key"""
+    n = len(values)
+    arr = np.fromiter(values, dtype=np.int32, count=n)
+    uniq, first_idx = np.unique(arr, return_index=True)
+    counts = np.bincount(arr)[uniq]
+    key = counts.astype(np.int64) * (n + 1) - first_idx
+    return uniq, counts, key
+
+
+def most_common(values: List[int], k: int = 5) -> List[Tuple[int, int]]:
+    """Drop-in for Counter(values).most_common(k) on small non-negative ints
+
+    Ties keep Counter's order (first occurrence wins), so the packed key
+    count * (n + 1) - first_index is unique and argpartition is safe.
+    """
+    if not values:
+        return []
+    uniq, counts, key = _count_keys(values)
+    k = min(k, uniq.shape[0])
+    top = np.argpartition(-key, k - 1)[:k]
+    top = top[np.argsort(-key[top])]
+    return [(int(uniq[i]), int(counts[i])) for i in top]
+
+
+def least_common(values: List[int], k: int = 5) -> List[Tuple[int, int]]:
+    """Drop-in for Counter(values).most_common()[:-k-1:-1] on small non-negative ints"""
+    if not values:
+        return []
+    uniq, counts, key = _count_keys(values)
+    k = min(k, uniq.shape[0])
+    low = np.argpartition(key, k - 1)[:k]
+    low = low[np.argsort(key[low])]
+    return [(int(uniq[i]), int(counts[i])) for i in low]
+
+
+def absent_numbers(values: List[int], low: int, high: int) -> List[int]:
+    """Numbers in [low, high) that never occur in values, ascending"""
+    arr = np.fromiter(values, dtype=np.int32, count=len(values))
+    counts = np.bincount(arr, minlength=high)
+    return (np.flatnonzero(counts[low:high] == 0) + low).tolist()
+
+
+def gap_stats(values: Sequence[int], target: int) -> Tuple[int, int, float, float]:
+    """Count, current missing, max and average gap of target in newest-first values"""
+    arr = np.asarray(values, dtype=np.int8)
+    n = arr.shape[0]
+    idx = np.flatnonzero(arr == target)
+    if idx.shape[0] == 0:
+        return 0, n, n, n
+    current_missing = int(idx[0])
+    gaps = np.diff(idx) - 1
+    if gaps.shape[0] == 0:
+        return 1, current_missing, current_missing, current_missing
+    return idx.shape[0], current_missing, int(gaps.max()), float(gaps.mean())
+
+
+def make_zodiac_tables(zodiac_numbers: Dict[str, Tuple[int, ...]]) -> Tuple['np.ndarray', 'np.ndarray']:
+    """Build zero-padded zodiac id -> numbers matrix plus row lengths"""
+    width = max(len(nums) for nums in zodiac_numbers.values())
+    table = np.zeros((len(zodiac_numbers), width), np.int8)
+    lengths = np.zeros(len(zodiac_numbers), np.int8)
+    for zodiac_id, numbers in enumerate(zodiac_numbers.values()):
+        table[zodiac_id, :len(numbers)] = numbers
+        lengths[zodiac_id] = len(numbers)
+    return table, lengths
+
+
+def pick_zodiac_numbers(table: 'np.ndarray', lengths: 'np.ndarray', zodiac_ids: List[int]) -> List[int]:
+    """Pick one random number for each zodiac id with a single gather"""
+    ids = np.asarray(zodiac_ids, dtype=np.intp)
+    cols = np.random.randint(0, lengths[ids])
+    return table[ids, cols].tolist()
+
+
+def make_number_zodiac(zodiac_numbers: Dict[str, Tuple[int, ...]]) -> 'np.ndarray':
+    """Build number -> zodiac id table (-1 for numbers without a zodiac)"""
+    table = np.full(50, -1, np.int8)
+    for zodiac_id, numbers in enumerate(zodiac_numbers.values()):
+        for num in numbers:
+            table[num] = zodiac_id
+    return table
+
+
+def comprehensive_top5(tema_list: Sequence[int], zodiac_ids: Sequence[int], num_zodiac: 'np.ndarray') -> List[int]:
+    """Rank numbers by comprehensive score, ties broken by smaller number"""
+    tema = np.asarray(tema_list, dtype=np.int8)
+    zids = np.asarray(zodiac_ids, dtype=np.int8)
+    if NUMBA_AVAILABLE:
+        scores = comprehensive_scores(tema, zids, num_zodiac)
+    else:
+        scores = comprehensive_scores_numpy(tema, zids, num_zodiac)
+    order = np.argsort(-scores[1:], kind='stable')[:5] + 1
+    return order.tolist()
+
+
+def freq_missing(tema_list: Sequence[int], n_numbers: int) -> Tuple['np.ndarray', 'np.ndarray']:
+    """Counts and most recent index (-1 = never) of numbers 0..n_numbers-1 in newest-first draws"""
+    tema = np.asarray(tema_list, dtype=np.int8)
+    if NUMBA_AVAILABLE:
+        return freq_missing_kernel(tema, n_numbers)
+    pos = np.flatnonzero((tema >= 0) & (tema < n_numbers))
+    counts = np.bincount(tema[pos], minlength=n_numbers).astype(np.int64)
+    last_seen = np.full(n_numbers, -1, np.int64)
+    seen, first_idx = np.unique(tema[pos], return_index=True)
+    last_seen[seen] = pos[first_idx]
+    return counts, last_seen
+
+
+def zodiac_factor_table(zodiac_ids: Sequence[int], period: int) -> List[List[float]]:
+    """Run zodiac_factor_scores on a sequence of zodiac ids (-1 = unknown)"""
+    ids = np.asarray(zodiac_ids, dtype=np.int8)
+    if NUMBA_AVAILABLE:
+        return zodiac_factor_scores(ids, period).tolist()
+    return zodiac_factor_scores_numpy(ids, period).tolist()
+
+
+def warmup(num_zodiac: 'np.ndarray'):
+    """Trigger JIT compilation once so the first prediction is not delayed"""
+    if not NUMBA_AVAILABLE:
+        return
+    comprehensive_top5([1], [0], num_zodiac)
+    zodiac_factor_table([0], 1)
+    freq_missing([1], 50)